@@ -0,0 +1,30 @@
+"""
+Time MergedOptions.as_dict on a large configuration made from many layers
+
+Usage::
+
+    python benchmarks/as_dict.py [number_of_keys]
+"""
+
+from option_merge import MergedOptions
+
+import timeit
+import sys
+
+def make_options(number_of_keys):
+    """Make a MergedOptions with this many keys spread across layers and prefixes"""
+    options = MergedOptions()
+    per_section = 100
+    for section in range(number_of_keys // per_section):
+        data = dict(("key{0}".format(i), {"value": i, "other": {"nested": section}}) for i in range(per_section // 2))
+        options.update({"section{0}".format(section): data})
+        options["section{0}".format(section)] = dict(("key{0}".format(i), {"value": i * 2}) for i in range(per_section // 2, per_section))
+    return options
+
+if __name__ == "__main__":
+    number_of_keys = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    options = make_options(number_of_keys)
+
+    for name, func in (("as_dict()", lambda: options.as_dict()), ("as_dict(section1)", lambda: options.as_dict("section1"))):
+        times = timeit.repeat(func, number=1 if not name.endswith("(section1)") else 100, repeat=5)
+        print("{0:<20} best of 5: {1:.4f}s".format(name, min(times)))
@@ -0,0 +1,43 @@
+"""
+Time MergedOptions.__getitem__ with string keys
+
+Usage::
+
+    python benchmarks/getitem.py [number_of_keys]
+
+Every repeat uses a new MergedOptions so that nothing is already cached, and
+looks up every key both as a dotted string and through prefixed children.
+"""
+
+from option_merge import MergedOptions
+
+import timeit
+import sys
+
+def make_data(number_of_keys):
+    """Make a dictionary with this many keys spread across sections"""
+    per_section = 100
+    return dict(
+          ("section{0}".format(section), dict(("key{0}".format(i), {"value": i}) for i in range(per_section)))
+          for section in range(number_of_keys // per_section)
+        )
+
+if __name__ == "__main__":
+    number_of_keys = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    data = make_data(number_of_keys)
+    keys = ["{0}.{1}.value".format(section, key) for section in sorted(data) for key in sorted(data[section])]
+
+    def dotted():
+        options = MergedOptions.using(data)
+        for key in keys:
+            options[key]
+
+    def children():
+        options = MergedOptions.using(data)
+        for key in keys:
+            section, key, _ = key.split(".")
+            options[section][key]["value"]
+
+    for name, func in (("options[dotted]", dotted), ("options[a][b][c]", children)):
+        times = timeit.repeat(func, number=1, repeat=5)
+        print("{0:<20} best of 5: {1:.4f}s".format(name, min(times)))
@@ -0,0 +1,48 @@
+"""
+Time how long importing option_merge takes using ``python -X importtime``
+
+Usage::
+
+    python benchmarks/import_time.py [statement]
+
+The statement defaults to importing the package and using MergedOptions. Each
+run is a fresh interpreter so nothing is already imported.
+"""
+
+import subprocess
+import sys
+import os
+
+def import_times(statement, runs=5):
+    """Return the best {module: (self, cumulative)} microseconds for this statement over these runs"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in (root, os.environ.get("PYTHONPATH")) if p))
+
+    best = {}
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], env=env, stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+        for line in output.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+
+            own, cumulative, name = line[len("import time:"):].split("|")
+            if not own.strip().isdigit():
+                continue
+
+            times = (int(own), int(cumulative))
+            name = name.strip()
+            if name not in best or times[1] < best[name][1]:
+                best[name] = times
+    return best
+
+if __name__ == "__main__":
+    statement = sys.argv[1] if len(sys.argv) > 1 else "import option_merge; option_merge.MergedOptions"
+    times = import_times(statement)
+
+    print("{0:<40} {1:>10} {2:>12}".format("module", "self (us)", "cumul (us)"))
+    for name, (own, cumulative) in sorted(times.items(), key=lambda item: -item[1][1])[:25]:
+        print("{0:<40} {1:>10} {2:>12}".format(name, own, cumulative))
+
+    total = sum(own for own, _ in times.values())
+    ours = sum(own for name, (own, _) in times.items() if name.startswith("option_merge"))
+    print("\ntotal {0}us, option_merge modules {1}us".format(total, ours))
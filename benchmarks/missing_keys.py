@@ -0,0 +1,41 @@
+"""
+Time MergedOptions.get for keys that usually aren't there
+
+Usage::
+
+    python benchmarks/missing_keys.py [number_of_layers]
+
+Each repeat asks for every key once from a new MergedOptions view of the same
+storage, so the answers for each key aren't already remembered.
+"""
+
+from option_merge import MergedOptions
+
+import timeit
+import sys
+
+def make_options(number_of_layers):
+    """Make a MergedOptions with this many layers of feature flags"""
+    options = MergedOptions()
+    for layer in range(number_of_layers):
+        options.update({"features": dict(("flag{0}_{1}".format(layer, i), True) for i in range(20)), "layer{0}".format(layer): {"value": layer}})
+    return options
+
+if __name__ == "__main__":
+    number_of_layers = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    options = make_options(number_of_layers)
+    missing = ["features.optional{0}".format(i) for i in range(2000)]
+    present = ["features.flag{0}_1".format(i) for i in range(number_of_layers)]
+
+    def probe(keys):
+        def run():
+            # Clear the caches so each key is looked for properly
+            options.storage.add(options.converted_path("unused"), {})
+            root = options.root()
+            for key in keys:
+                root.get(key)
+        return run
+
+    for name, keys in (("missing keys", missing), ("present keys", present)):
+        times = timeit.repeat(probe(keys), number=1, repeat=5)
+        print("{0:<15} best of 5: {1:.4f}s for {2} keys".format(name, min(times), len(keys)))
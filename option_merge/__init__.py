@@ -1,13 +1,39 @@
-from option_merge.merge import ConverterProperty, KeyValuePairsConverter, AttributesConverter
-from option_merge.merge import MergedOptions
-from option_merge.converter import Converter
-from option_merge.not_found import NotFound
-
-# Explicitly make these part of this module
-NotFound = NotFound
-Converter = Converter
-MergedOptions = MergedOptions
-ConverterProperty = ConverterProperty
-AttributesConverter = AttributesConverter
-KeyValuePairsConverter = KeyValuePairsConverter
+import sys
 
+# The module each public name comes from
+lazy_names = {
+      "NotFound": "option_merge.not_found"
+    , "Converter": "option_merge.converter"
+    , "MergedOptions": "option_merge.merge"
+    , "ConverterProperty": "option_merge.merge"
+    , "AttributesConverter": "option_merge.merge"
+    , "KeyValuePairsConverter": "option_merge.merge"
+    }
+
+if sys.version_info >= (3, 7):
+    # Only import what is used so short lived programs start quicker
+    def __getattr__(name):
+        if name not in lazy_names:
+            raise AttributeError("module {0!r} has no attribute {1!r}".format(__name__, name))
+
+        __import__(lazy_names[name])
+        val = globals()[name] = getattr(sys.modules[lazy_names[name]], name)
+        return val
+
+    def __dir__():
+        return sorted(set(globals()) | set(lazy_names))
+else:
+    from option_merge.merge import ConverterProperty, KeyValuePairsConverter, AttributesConverter
+    from option_merge.merge import MergedOptions
+    from option_merge.converter import Converter
+    from option_merge.not_found import NotFound
+
+    # Explicitly make these part of this module
+    NotFound = NotFound
+    Converter = Converter
+    MergedOptions = MergedOptions
+    ConverterProperty = ConverterProperty
+    AttributesConverter = AttributesConverter
+    KeyValuePairsConverter = KeyValuePairsConverter
+
+__all__ = sorted(lazy_names)
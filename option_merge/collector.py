@@ -63,7 +63,7 @@ For example:
 
 from option_merge.converter import Converter
 
-from getpass import getpass
+import threading
 import logging
 import os
 
@@ -73,7 +73,13 @@ class Collector(object):
     """
     When using the Collector, it is expected that you implement a number of hooks
     to make this class useful.
+
+    Set ``read_workers`` to read files in that many threads. Files are read
+    ahead of time as the ``includes_for`` hook finds them, but are still added
+    to the configuration in the same order as when they are read one at a time.
     """
+    read_workers = 0
+
     class BadFileErrorKls(Exception):
         _fake_delfick_error = True
         def __init__(self, message):
@@ -127,6 +133,17 @@ class Collector(object):
         """Hook to read in a file and return a dictionary"""
         raise NotImplementedError()
 
+    def read_sections(self, location):
+        """
+        Hook to read a file as a list of (key, loader) sections instead of with read_file
+
+        Returning None means read_file is used. Otherwise the result given to
+        add_configuration is a MergedOptions that only calls the loader for a
+        key when something looks inside that key.
+        See :mod:`option_merge.sections`.
+        """
+        return None
+
     def start_configuration(self):
         """Hook for starting the base of the configuration"""
         raise NotImplementedError()
@@ -141,6 +158,15 @@ class Collector(object):
         """
         raise NotImplementedError()
 
+    def includes_for(self, result, src):
+        """
+        Hook to return the locations that add_configuration will collect for this result
+
+        These are only used to read files ahead of time when ``read_workers``
+        is set. It is called in the reading thread before the result is added.
+        """
+        return []
+
     def extra_configuration_collection(self, configuration):
         """Hook to do any extra configuration collection or converter registration"""
 
@@ -206,12 +232,26 @@ class Collector(object):
                     configuration[k] = NotSpecified
             make_converter(key, spec)
 
+    def write_snapshot(self, location, ignore=("getpass", "collector", "args_dict"), default=None):
+        """
+        Write a snapshot of our configuration to this location
+
+        The snapshot is stale when any of the files we collected configuration
+        from change. See :mod:`option_merge.snapshot`.
+        """
+        # Only imported when used so importing the collector stays quick
+        from option_merge import snapshot
+        snapshot.dump(self.configuration, location, files=self.configuration_files, ignore=ignore, default=default)
+
     ########################
     ###   CONFIG
     ########################
 
     def collect_configuration(self, configuration_file, args_dict, extra_files=None):
         """Return us a MergedOptions with this configuration and any collected configurations"""
+        # getpass is only imported here because it's slow to import and rarely needed
+        from getpass import getpass
+
         errors = []
 
         configuration = self.start_configuration()
@@ -236,9 +276,15 @@ class Collector(object):
             sources.insert(0, home_dir_configuration)
 
         done = set()
+        adding = []
+        reader = IncludeReader(self.read_location, self.read_workers)
+        self.configuration_files = []
         def add_configuration(src, prefix=None, extra=None):
             log.info("Adding configuration from %s", os.path.abspath(src))
             if os.path.abspath(src) in done:
+                if os.path.abspath(src) in adding:
+                    cycle = adding[adding.index(os.path.abspath(src)):] + [os.path.abspath(src)]
+                    log.warning("Ignoring circular include of configuration\tchain=%s", " -> ".join(cycle))
                 return
             else:
                 done.add(os.path.abspath(src))
@@ -247,14 +293,12 @@ class Collector(object):
                 return
 
             try:
-                if os.stat(src).st_size == 0:
-                    result = {}
-                else:
-                    result = self.read_file(src)
+                result = reader.result(src)
             except self.BadFileErrorKls as error:
                 errors.append(error)
                 return
 
+            self.configuration_files.append(os.path.abspath(src))
             if not result:
                 return
 
@@ -266,10 +310,18 @@ class Collector(object):
                 part = prefix.pop()
                 result = {part: result}
 
-            self.add_configuration(configuration, add_configuration, done, result, src)
+            adding.append(os.path.abspath(src))
+            try:
+                self.add_configuration(configuration, add_configuration, done, result, src)
+            finally:
+                adding.pop()
 
-        for source in sources:
-            add_configuration(source)
+        try:
+            reader.fetch(sources)
+            for source in sources:
+                add_configuration(source)
+        finally:
+            reader.finish()
 
         self.extra_configuration_collection(configuration)
 
@@ -278,3 +330,90 @@ class Collector(object):
 
         return configuration
 
+    def read_location(self, src):
+        """
+        Return the result from this file and the absolute locations it includes
+
+        This is run in the reading threads when we have ``read_workers``, so a
+        location that isn't a path complains here and the error is raised when
+        the result is asked for.
+        """
+        if os.stat(src).st_size == 0:
+            return {}, []
+
+        sections = self.read_sections(src)
+        if sections is not None:
+            from option_merge.sections import sectioned_options
+            result = sectioned_options(sections, source=src)
+        else:
+            result = self.read_file(src)
+
+        if not result or not self.read_workers:
+            return result, []
+        return result, [os.path.abspath(location) for location in self.includes_for(result, src) or [] if location is not None]
+
+
+class IncludeReader(object):
+    """
+    Read configuration files, ahead of time in a pool of threads if we have workers
+
+    Every file we fetch has the files it includes fetched as soon as it has
+    been read, so independent files across the whole include graph are read at
+    the same time. Results are only handed out when asked for with ``result``.
+    """
+    def __init__(self, read, workers=0):
+        self.read = read
+        self.lock = threading.Lock()
+        self.pending = {}
+
+        self.pool = None
+        if workers:
+            from multiprocessing.pool import ThreadPool
+            self.pool = ThreadPool(workers)
+
+    def fetch(self, sources):
+        """Start reading these sources if we aren't already"""
+        with self.lock:
+            if self.pool is None:
+                return
+
+            for src in sources:
+                if src is None:
+                    continue
+
+                location = os.path.abspath(src)
+                if location in self.pending or not os.path.exists(location):
+                    continue
+
+                self.pending[location] = self.pool.apply_async(self.read, (src, ), callback=self.fetch_includes)
+
+    def fetch_includes(self, read):
+        """
+        Called with what we read in the pool so we start on the files it includes
+
+        This runs in the thread that hands out results from the pool, so it
+        must never raise. If it did, that thread would stop and anything
+        waiting for a result would wait forever.
+        """
+        try:
+            self.fetch(read[1])
+        except Exception as error:
+            log.error("Failed to read includes ahead of time\terror=%s", error)
+
+    def result(self, src):
+        """Return what we read from this src, reading it now if it wasn't fetched"""
+        with self.lock:
+            pending = self.pending.get(os.path.abspath(src))
+
+        if pending is None:
+            return self.read(src)[0]
+        return pending.get()[0]
+
+    def finish(self):
+        """Stop reading anything we haven't got to yet"""
+        with self.lock:
+            pool, self.pool = self.pool, None
+
+        if pool is not None:
+            pool.terminate()
+            pool.join()
@@ -69,6 +69,19 @@ class Converters(object):
         self.version = 0
         self.activated = False
 
+    def __getstate__(self):
+        """
+        Pickle only the results of conversion
+
+        The converters themselves are usually closures and can't be pickled.
+        """
+        return {"_converted": self._converted, "activated": self.activated, "version": self.version}
+
+    def __setstate__(self, state):
+        """Restore the results of conversion without any converters"""
+        self.__init__()
+        self.__dict__.update(state)
+
     def __iter__(self):
         """
         Iterate through the converters
@@ -84,6 +97,10 @@ class Converters(object):
         self._converters.append(converter)
         self.version += 1
 
+    def empty(self):
+        """Return whether we have no converters, regardless of being activated"""
+        return not self._converters
+
     def activate(self):
         """Mark the converters as activated"""
         self.activated = True
@@ -1,6 +1,7 @@
-from option_merge.merge import MergedOptions
 from option_merge.joiner import dot_joiner
 
+import six
+
 def prefixed_path_list(path, prefix=None):
     """Return the prefixed version of this path as a list"""
     res_type = type(path)
@@ -45,26 +46,220 @@ def make_dict(first, rest, data):
 
     return result
 
+def is_dict(item):
+    """
+    Return whether this item is merged into rather than replacing what is there
+
+    MergedOptions is a subclass of dict, so this is the same as checking for
+    a dictionary, with a quicker check for plain dictionaries first.
+    """
+    return type(item) is dict or isinstance(item, dict)
+
 def merge_into_dict(target, source, seen=None, ignore=None):
-    """Merge source into target"""
+    """
+    Merge source into target
+
+    Nested dictionaries are merged depth first in the order of their keys,
+    using a stack of what is left to merge rather than recursion.
+    """
     if ignore is None:
         ignore = []
 
-    if hasattr(source, "is_dict") and source.is_dict:
-        if hasattr(source, "as_dict"):
-            source = source.as_dict(seen=seen, ignore=ignore)
-        else:
-            source = dict(source)
+    stack = [(target, source)]
+    while stack:
+        target, source = stack.pop()
+        if type(source) is not dict and getattr(source, "is_dict", False):
+            if hasattr(source, "as_dict"):
+                source = source.as_dict(seen=seen, ignore=ignore)
+            else:
+                source = dict(source)
 
-    for key in source.keys():
-        if key in ignore:
-            continue
-        val = source[key]
+        nested = []
+        for key in source.keys():
+            if key in ignore:
+                continue
+            val = source[key]
+
+            if type(val) is dict or isinstance(val, dict):
+                existing = target.get(key)
+                if type(existing) is not dict and not isinstance(existing, dict):
+                    existing = target[key] = {}
+                nested.append((existing, val))
+            else:
+                target[key] = val
+
+        if nested:
+            nested.reverse()
+            stack.extend(nested)
+
+def has_simple_keys(data):
+    """
+    Return whether data is a dictionary with only strings without dots for keys
 
-        is_dict = lambda item: type(item) in (dict, MergedOptions) or isinstance(item, dict)
-        if is_dict(val):
-            if not is_dict(target.get(key)):
+    Including the keys of the dictionaries inside it. Anything inside that is
+    dictionary like but not a plain dictionary looks after its own keys.
+    """
+    if type(data) is not dict:
+        return False
+
+    stack = [data]
+    while stack:
+        current = stack.pop()
+        for key, val in current.items():
+            if not isinstance(key, six.string_types) or "." in key:
+                return False
+            if type(val) is dict:
+                stack.append(val)
+    return True
+
+def holds_options(data):
+    """
+    Return whether data is a dictionary holding, at any depth, something that
+    is dictionary like but isn't a plain dictionary, like a MergedOptions
+    """
+    if type(data) is not dict:
+        return False
+
+    stack = [data]
+    while stack:
+        for val in stack.pop().values():
+            if type(val) is dict:
+                stack.append(val)
+            elif isinstance(val, dict) or getattr(val, "is_dict", False) is True:
+                return True
+    return False
+
+def copy_dicts(data):
+    """Return a copy of data with new dictionaries all the way down but the same other values"""
+    if type(data) is not dict:
+        return data
+
+    result = {}
+    stack = [(result, data)]
+    while stack:
+        target, source = stack.pop()
+        for key, val in source.items():
+            if type(val) is dict:
                 target[key] = {}
-            merge_into_dict(target[key], val, seen=seen, ignore=ignore)
+                stack.append((target[key], val))
+            else:
+                target[key] = val
+    return result
+
+def combined_dicts(dicts):
+    """
+    Return a new dictionary that is these dictionaries deeply merged together
+
+    Later dictionaries take precedence over earlier ones. The nested
+    dictionaries of the result are new, but the other values are not copied.
+
+    Return None if any of them can't be combined. (see ``combine_into``)
+    """
+    result = {}
+    for data in dicts:
+        if not combine_into(result, data):
+            return None
+    return result
+
+def combine_into(result, data):
+    """
+    Deeply merge the data into result and return True
+
+    Or return False and leave result alone if the data has keys with dots in
+    them, holds dictionary like objects that aren't plain dictionaries, or
+    replaces a dictionary in result with something that isn't a dictionary,
+    or the other way round. Those can't be combined without changing what a
+    MergedOptions would find in them, as it still looks past a value that
+    isn't a dictionary for the keys of dictionaries underneath it.
+    """
+    stack = [(result, data)]
+    while stack:
+        target, source = stack.pop()
+        for key, val in source.items():
+            if "." in str(key):
+                return False
+
+            if (isinstance(val, dict) and type(val) is not dict) or getattr(val, "is_dict", False) is True:
+                return False
+
+            if target is None or key not in target:
+                if type(val) is dict:
+                    stack.append((None, val))
+            elif (type(val) is dict) != (type(target[key]) is dict):
+                return False
+            elif type(val) is dict:
+                stack.append((target[key], val))
+
+    stack = [(result, data)]
+    while stack:
+        target, source = stack.pop()
+        for key, val in source.items():
+            if type(val) is dict:
+                if key not in target:
+                    target[key] = {}
+                stack.append((target[key], val))
+            else:
+                target[key] = val
+    return True
+
+def interned(data, table):
+    """
+    Return data with every dictionary and list in it replaced by an identical
+    one from this table, adding the ones the table doesn't have yet
+
+    The table is {structure: canonical object}, where the structure of a
+    dictionary or list is made from its keys and their types, its other values
+    and the ids of the canonical dictionaries and lists inside it. So equal subtrees end up
+    as the one object, and only new subtrees are copied.
+
+    Anything that isn't a plain dictionary or list is kept as is.
+    """
+    if type(data) not in (dict, list):
+        return data
+
+    found = {}
+    visiting = set()
+    stack = [(data, False)]
+    while stack:
+        current, ready = stack.pop()
+        if id(current) in found:
+            continue
+
+        items = list(current.items()) if type(current) is dict else list(enumerate(current))
+        if not ready:
+            visiting.add(id(current))
+            stack.append((current, True))
+            stack.extend((val, False) for _, val in items if type(val) in (dict, list) and id(val) not in found and id(val) not in visiting)
+            continue
+
+        changed = False
+        values = []
+        structure = []
+        for key, val in items:
+            if type(val) in (dict, list):
+                canonical = found.get(id(val), val)
+                changed = changed or canonical is not val
+                val, part = canonical, ("id", id(canonical))
+            else:
+                try:
+                    hash(val)
+                    part = ("value", type(val), val)
+                except TypeError:
+                    part = ("id", id(val))
+            values.append((key, val))
+            structure.append((type(key), key, part))
+
+        if type(current) is dict:
+            structure = ("dict", frozenset(structure))
         else:
-            target[key] = val
+            structure = ("list", tuple(part for _, _, part in structure))
+
+        canonical = table.get(structure)
+        if canonical is None:
+            canonical = current
+            if changed:
+                canonical = dict(values) if type(current) is dict else [val for _, val in values]
+            table[structure] = canonical
+        found[id(current)] = canonical
+
+    return found[id(data)]
@@ -4,6 +4,7 @@ Helpers for joining together things
 
 import six
 
+# Set by option_merge.path when it is imported so we don't import it per call
 Path = None
 list_types = (list, tuple)
 string_types = (str, ) + six.string_types
@@ -29,10 +30,6 @@ def dot_join_item(item, item_type):
     result = []
     for part in item:
         part_type = type(part)
-        global Path
-        if Path is None:
-            from option_merge.path import Path
-
         if part_type is Path:
             joined = part.joined()
             if joined:
@@ -53,14 +50,11 @@ def join(one, two):
 
     Where either path is either string, list of strings or Path
     """
-    global Path
-    if Path is None:
-        from option_merge.path import Path
-
-    if isinstance(one, Path):
-        one = one.path
-    if isinstance(two, Path):
-        two = two.path
+    if Path is not None:
+        if isinstance(one, Path):
+            one = one.path
+        if isinstance(two, Path):
+            two = two.path
 
     if isinstance(one, six.string_types):
         if isinstance(two, six.string_types):
@@ -11,18 +11,24 @@ With the ability to delete from the dictionary and the ability to convert values
 on access.
 """
 
-from option_merge.versioning import versioned_iterable, versioned_value
+from option_merge.versioning import versioned_iterable, versioned_value, cache_sizes
 from option_merge.converter import Converters, Converter
 from option_merge.not_found import NotFound
 from option_merge.joiner import dot_joiner
+from option_merge import helper as hp
 from option_merge.path import Path
 
+from six.moves import copyreg
 from collections import Mapping
 import logging
 import six
+import gc
 
 log = logging.getLogger("option_merge.merge")
 
+# Storage needs MergedOptions, so option_merge.storage sets this when it's imported
+Storage = None
+
 class KeyValuePairsConverter(object):
     """Converts a list of key,value pairs to a dictionary"""
     def __init__(self, pairs, source=None):
@@ -31,7 +37,6 @@ class KeyValuePairsConverter(object):
 
     def convert(self):
         """Return us a MergedOptions from our pairs"""
-        from option_merge import helper as hp
         return MergedOptions().using(*[hp.make_dict(key[0], key[1:], value) for key, value in self.pairs], source=self.source)
 
 class AttributesConverter(object):
@@ -97,6 +102,9 @@ class MergedOptions(dict, Mapping):
     When you delete a key, it removes it from the first dictionary it can find.
     This means a key can change value when deleted rather than disappearing altogether
 
+    The dictionaries you provide aren't changed by deleting from them, instead
+    the storage remembers what was deleted from each dictionary.
+
     It will also merge deeply.
 
     So::
@@ -145,10 +153,22 @@ class MergedOptions(dict, Mapping):
         self.prefix_string = dot_joiner(self.prefix_list, list)
 
         self.storage = storage
-        from option_merge.storage import Storage
         if self.storage is None:
+            if Storage is None:
+                # Importing the storage module sets Storage for us
+                import option_merge.storage
             self.storage = Storage()
 
+    def __reduce_ex__(self, protocol):
+        """
+        Pickle our attributes without any of the caches
+
+        We don't let pickle treat us as a dictionary, which would mean adding
+        all our keys as new layers when unpickled.
+        """
+        state = dict((key, val) for key, val in self.__dict__.items() if not key.startswith("_"))
+        return (copyreg.__newobj__, (self.__class__, ), state)
+
     @classmethod
     def using(cls, *options, **kwargs):
         """
@@ -168,7 +188,17 @@ class MergedOptions(dict, Mapping):
 
         Any kwargs given to ``using`` is passed into ``update`` for
         each provided dictionary.
+
+        If ``coalesce=True`` is given then consecutive plain dictionaries are
+        merged together up front and added as one layer, so that later lookups
+        have less layers to look through. Dictionaries with dots in their keys
+        or with dictionary like objects in them are still added separately, and
+        a run stops before a dictionary that replaces a dictionary from earlier
+        in the run with something that isn't one, or the other way round. Note that ``source_for``
+        won't know about values that were overridden by a later dictionary in
+        the same run.
         """
+        coalesce = kwargs.pop("coalesce", False)
         prefix = kwargs.get('prefix')
         storage = kwargs.get('storage')
         converters = kwargs.get('converters')
@@ -179,22 +209,71 @@ class MergedOptions(dict, Mapping):
             , converters=converters, ignore_converters=ignore_converters
             )
 
+        if coalesce:
+            options = merged.coalesced(options)
+
         for opts in options:
             merged.update(opts, **kwargs)
         return merged
 
+    def coalesced(self, options):
+        """
+        Return these options with runs of plain dictionaries merged together
+
+        A run stops before a dictionary that can't be combined with the ones
+        before it (see ``hp.combine_into``) and dictionaries that can't be
+        combined with anything are returned as they are.
+        """
+        result = []
+        run = []
+        combined = [{}]
+        def flush():
+            if len(run) == 1:
+                result.append(run[0])
+            elif run:
+                result.append(combined[0])
+            del run[:]
+            combined[0] = {}
+
+        for opts in options:
+            if opts is None:
+                continue
+
+            if type(opts) is dict:
+                if not hp.combine_into(combined[0], opts):
+                    flush()
+                    if not hp.combine_into(combined[0], opts):
+                        result.append(opts)
+                        continue
+                run.append(opts)
+            else:
+                flush()
+                result.append(opts)
+
+        flush()
+        return result
+
     @property
     def version(self):
         return self.storage.version
 
-    def update(self, options, source=None, **kwargs):
+    def update(self, options, source=None, frozen=False, dedupe=False, **kwargs):
         """
         Add new options to the storage under this prefix.
 
         The later options are added, the more influence they have.
+
+        Passing ``frozen=True`` is a promise that nothing will change these
+        options after they are added, which lets the storage remember things
+        about them to make lookups quicker. The storage itself never changes
+        the options it is given.
+
+        Passing ``dedupe=True`` makes the same promise, and also lets the
+        storage replace dictionaries and lists in these options with identical
+        ones it already holds from other deduped options.
         """
         if options is None: return
-        self.storage.add(Path(self.prefix_list), options, source=source)
+        self.storage.add(Path(self.prefix_list), options, source=source, frozen=frozen, dedupe=dedupe)
 
     @versioned_value
     def __getitem__(self, path, ignore_converters=False):
@@ -216,16 +295,19 @@ class MergedOptions(dict, Mapping):
         for val, return_as_is in self.values_for(path, ignore_converters=path.ignore_converters):
             if return_as_is:
                 return val
-
-            if any(isinstance(val, unprefixed) for unprefixed in self.dont_prefix):
-                return val
-            elif type(val) in (dict, MergedOptions) or isinstance(val, dict):
-                return self.prefixed(path, already_prefixed=True)
-            else:
-                return val
+            return self.value_for_path(path, val)
 
         raise KeyError(path)
 
+    def value_for_path(self, path, val):
+        """Return val as is, or a MergedOptions prefixed to path if val is a dictionary"""
+        if any(isinstance(val, unprefixed) for unprefixed in self.dont_prefix):
+            return val
+        elif type(val) in (dict, MergedOptions) or isinstance(val, dict):
+            return self.prefixed(path, already_prefixed=True)
+        else:
+            return val
+
     def __contains__(self, path):
         """
         Ask storage if it has a path
@@ -272,6 +354,38 @@ class MergedOptions(dict, Mapping):
         except KeyError:
             return default
 
+    def get_many(self, paths, default=None, ignore_converters=False):
+        """
+        Get many paths at once, using default for any that aren't found
+
+        .. code-block:: python
+
+            m = MergedOptions.using({"a": 1, "b": {"c": 2}})
+            assert m.get_many(["a", "b.c", "d"], default=3) == [1, 2, 3]
+
+        This is equivalent to calling ``get`` for each path, except the layers
+        in storage are only looked at once for all the paths that don't have
+        converters.
+        """
+        ignore_converters = ignore_converters or self.ignore_converters
+        paths = [self.converted_path(path, ignore_converters=ignore_converters or getattr(path, "ignore_converters", False)) for path in paths]
+
+        wanted = []
+        for path in paths:
+            if path.ignore_converters or not (path.waiting() or path.converted() or path.find_converter()[1]):
+                wanted.append(path)
+
+        found = self.storage.first_values(wanted)
+
+        result = []
+        for path in paths:
+            joined = path.joined()
+            if joined in found:
+                result.append(self.value_for_path(path, found[joined]))
+            else:
+                result.append(self.get(path, default, ignore_converters=path.ignore_converters))
+        return result
+
     def source_for(self, path, chain=None):
         """
         Proxy self.storage.source_for
@@ -283,6 +397,23 @@ class MergedOptions(dict, Mapping):
         path = Path.convert(path, self).ignoring_converters(True)
         return self.storage.source_for(path, chain)
 
+    def source_map(self):
+        """
+        Return {path: [sources]} for every path under this MergedOptions
+
+        .. code-block:: python
+
+            m = MergedOptions.using({"a": {"b": 1}}, source="one")
+            m.update({"a": {"c": 2}}, source="two")
+            assert m.source_map() == {"a": ["two", "one"], "a.b": ["one"], "a.c": ["two"]}
+
+        This gives the same answer as calling ``source_for`` for every path but
+        only looks at each layer in the storage once.
+        """
+        found = self.storage.nested_sources(self, [])
+        found.pop("", None)
+        return found
+
     def __setitem__(self, path, value):
         """
         Set a key in the storage
@@ -318,6 +449,21 @@ class MergedOptions(dict, Mapping):
         """
         self.storage.delete(self.converted_path(path))
 
+    def delete_many(self, paths):
+        """
+        Delete many keys from the storage
+
+        .. code-block:: python
+
+            m = MergedOptions.using({"a": 1, "b": {"c": 2, "d": 3}})
+            m.delete_many(["a", "b.c"])
+            assert m.as_dict() == {"b": {"d": 3}}
+
+        This is the same as using ``del`` for each path in turn, but the storage
+        only has to look at all of its layers once.
+        """
+        self.storage.delete_many([self.converted_path(path) for path in paths])
+
     def __iter__(self):
         """Iterate over the keys"""
         return iter(self.keys())
@@ -351,14 +497,24 @@ class MergedOptions(dict, Mapping):
                 pass
 
     def prefixed(self, path, ignore_converters=False, already_prefixed=False):
-        """Return a MergedOptions prefixed to this path"""
-        return self.__class__(
-              self.converted_path(path, ignore_converters=ignore_converters)
-            , storage=self.storage
-            , dont_prefix=self.dont_prefix
-            , converters=self.converters
-            , ignore_converters=ignore_converters
-            )
+        """
+        Return a MergedOptions prefixed to this path
+
+        The storage remembers the MergedOptions it gives out so that asking for
+        the same path again gets the same MergedOptions, along with its caches.
+        """
+        path = self.converted_path(path, ignore_converters=ignore_converters)
+        key = (self.__class__, path.joined(), ignore_converters, tuple(self.dont_prefix), id(self.converters))
+
+        def make():
+            return self.__class__(
+                  path
+                , storage=self.storage
+                , dont_prefix=self.dont_prefix
+                , converters=self.converters
+                , ignore_converters=ignore_converters
+                )
+        return self.storage.view(key, make)
 
     def root(self):
         """Return a MergedOptions looking at the root of the storage"""
@@ -380,8 +536,19 @@ class MergedOptions(dict, Mapping):
 
             m = MergedOptions.using("a")
             wrapped = MergedOptions.using(m, converters=m.converters, dont_prefix=m.dont_prefix)
+
+        Except when we aren't prefixed, in which case the new MergedOptions
+        uses an overlay of our storage so that lookups look at our layers
+        directly rather than going through this MergedOptions.
         """
-        return self.__class__.using(self, converters=self.converters, dont_prefix=self.dont_prefix)
+        if self.prefix_string:
+            return self.__class__.using(self, converters=self.converters, dont_prefix=self.dont_prefix)
+
+        return self.__class__(
+              storage=self.storage.overlay()
+            , dont_prefix=self.dont_prefix
+            , converters=self.converters
+            )
 
     def keys(self, ignore_converters=False):
         """Return a de-duplicated list of the keys we know about"""
@@ -422,7 +589,6 @@ class MergedOptions(dict, Mapping):
         if isPath:
             joined = path.joined()
         else:
-            from option_merge import helper as hp
             if path_type in (list, tuple):
                 path, joined = hp.prefixed_path_list(path, self.prefix_list)
             else:
@@ -458,7 +624,43 @@ class MergedOptions(dict, Mapping):
             convert = make_converter(name, spec)
             self.add_converter(Converter(convert=convert, convert_path=[name]))
 
+    def memory_report(self):
+        """
+        Return a dictionary describing what this MergedOptions holds on to
+
+        storage
+            The ``stats`` of our storage, including the keys in each layer and
+            the values that more than one layer has
+
+        caches
+            {name: size} of the versioned caches on us and on the views of our
+            storage that are still being used
+
+        converters
+            How many converters we have and how many paths they have converted
+            or are waiting on
+
+        paths
+            How many Path objects are alive in the process
+        """
+        views = self.storage.views()
+        caches = cache_sizes(self)
+        for view in views:
+            if view is not self:
+                for name, size in cache_sizes(view).items():
+                    caches[name] = caches.get(name, 0) + size
+
+        return {
+              "storage": self.storage.stats()
+            , "caches": caches
+            , "converters":
+              { "converters": len(self.converters._converters)
+              , "converted": len(self.converters._converted)
+              , "waiting": len(self.converters._waiting)
+              }
+            , "paths": sum(1 for obj in gc.get_objects() if type(obj) is Path)
+            }
+
     def as_dict(self, key="", ignore_converters=True, seen=None, ignore=None):
         """Collapse the storage at this prefix into a single dictionary"""
         return self.storage.as_dict(self.converted_path(key, ignore_converters=ignore_converters), seen=seen, ignore=ignore)
-
@@ -11,6 +11,7 @@ or a list of strings.
 
 from option_merge.joiner import dot_joiner, join
 from option_merge.not_found import NotFound
+from option_merge import joiner
 
 import six
 
@@ -45,11 +46,24 @@ class Path(object):
 
         self._joined = joined
         self._joined_function = joined_function
+        self._hash = None
 
         self.converters = converters
         self.configuration = configuration
         self.ignore_converters = ignore_converters
 
+    def __getstate__(self):
+        """
+        Pickle only the path and whether to ignore converters
+
+        The configuration and converters are left behind
+        """
+        return {"path": self.path, "joined": self.joined(), "ignore_converters": self.ignore_converters}
+
+    def __setstate__(self, state):
+        """Restore a pickled path without a configuration or converters"""
+        self.__init__(state["path"], ignore_converters=state["ignore_converters"], joined=state["joined"])
+
     def __unicode__(self):
         """alias for self.joined"""
         return self.joined()
@@ -97,8 +111,16 @@ class Path(object):
         """
         Compare the joined version of this path
         and the joined version of the other path
+
+        Other paths are compared by their joined strings, which are the
+        canonical form of a path, and hashes if we both know them already.
         """
         joined = self.joined()
+        if type(other) is Path:
+            if self._hash is not None and other._hash is not None and self._hash != other._hash:
+                return False
+            return joined == other.joined()
+
         if not other and not joined:
             return True
 
@@ -119,8 +141,11 @@ class Path(object):
             return self.using(join(self, other))
 
     def __hash__(self):
-        """The hash of the joined version of this path"""
-        return hash(self.joined())
+        """The hash of the joined version of this path, remembered after the first time"""
+        result = self._hash
+        if result is None:
+            result = self._hash = hash(self.joined())
+        return result
 
     def __getitem__(self, key):
         """
@@ -139,13 +164,18 @@ class Path(object):
         if base_type not in (str, ) + six.string_types:
             base = dot_joiner(base, base_type)
 
+        if base and self.path_type is list:
+            # Quick path when our first parts are the segments of the base
+            base_segments = base.split(".")
+            count = len(base_segments)
+            if self.path[:count] == base_segments and "" not in base_segments:
+                return self.using(self.path[count:])
+
         if not self.startswith(base):
             raise NotFound()
 
         if self.path_is_string:
-            path = self.path[len(base):]
-            while path and path[0] == ".":
-                path = path[1:]
+            path = self.path[len(base):].lstrip(".")
             return self.using(path, joined=path)
         else:
             if not base:
@@ -287,3 +317,4 @@ class Path(object):
                 joined = self._joined = dot_joiner(self.path, self.path_type)
         return joined
 
+joiner.Path = Path
@@ -0,0 +1,135 @@
+"""
+Sections let us use a large document without parsing all of it up front.
+
+.. code-block:: python
+
+    from option_merge.sections import json_sections
+
+    class JsonCollector(Collector):
+        def read_sections(self, location):
+            if os.path.getsize(location) > 10 * 1024 * 1024:
+                return json_sections(location)
+
+A section is a ``(key, loader)`` pair for each top level key of the document,
+where calling ``loader()`` returns the parsed value of that key. The collector
+turns each section into a lazy layer, so a key is only parsed the first time
+something looks inside it.
+
+``json_sections`` finds where each top level value starts and ends by scanning
+the memory mapped file for brackets and strings. The loaders read just their
+part of the file when they are called.
+"""
+
+from option_merge.storage import LazyData
+from option_merge.merge import MergedOptions
+from option_merge.path import Path
+
+import mmap
+import json
+import re
+
+whitespace_regex = re.compile(br'\s*')
+significant_regex = re.compile(br'["{}\[\],]')
+string_end_regex = re.compile(br'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+
+def json_sections(location):
+    """Return a list of (key, loader) for each top level key in the json object at this location"""
+    with open(location, "rb") as fle:
+        data = mmap.mmap(fle.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            spans = list(json_spans(data))
+        finally:
+            data.close()
+    return [(key, SpanLoader(location, start, end)) for key, start, end in spans]
+
+def sectioned_options(sections, source=None):
+    """Return a MergedOptions with a lazy layer for each (key, loader) section"""
+    options = MergedOptions()
+    for key, loader in sections:
+        options.storage.add(Path([key]), LazyData(loader), source=source)
+    return options
+
+class SpanLoader(object):
+    """
+    Parses the json between start and end in this file when called
+
+    This is a class rather than a closure so that options made from sections
+    can be pickled.
+    """
+    def __init__(self, location, start, end):
+        self.end = end
+        self.start = start
+        self.location = location
+
+    def __call__(self):
+        with open(self.location, "rb") as fle:
+            fle.seek(self.start)
+            return json.loads(fle.read(self.end - self.start).decode("utf-8"))
+
+def json_spans(data):
+    """Yield (key, start, end) for each top level value in this json object"""
+    pos = skip_whitespace(data, 0)
+    expect(data, pos, b"{")
+    pos = skip_whitespace(data, pos + 1)
+    if data[pos:pos+1] == b"}":
+        return
+
+    while True:
+        expect(data, pos, b'"')
+        end = string_end(data, pos + 1)
+        key = json.loads(data[pos:end].decode("utf-8"))
+
+        pos = skip_whitespace(data, end)
+        expect(data, pos, b":")
+        start = skip_whitespace(data, pos + 1)
+        end = value_end(data, start)
+        yield key, start, end
+
+        pos = skip_whitespace(data, end)
+        if data[pos:pos+1] == b"}":
+            return
+        expect(data, pos, b",")
+        pos = skip_whitespace(data, pos + 1)
+
+def value_end(data, start):
+    """Return where the json value starting at start ends"""
+    if data[start:start+1] == b'"':
+        return string_end(data, start + 1)
+
+    depth = 0
+    pos = start
+    while True:
+        m = significant_regex.search(data, pos)
+        if m is None:
+            raise ValueError("Json object isn't closed")
+
+        char = m.group()
+        pos = m.end()
+        if char == b'"':
+            pos = string_end(data, pos)
+        elif char in (b"{", b"["):
+            depth += 1
+        elif char in (b"}", b"]"):
+            if depth == 0:
+                return m.start()
+            depth -= 1
+            if depth == 0:
+                return pos
+        elif depth == 0:
+            return m.start()
+
+def string_end(data, pos):
+    """Return the position after the closing quote of the string that continues at pos"""
+    m = string_end_regex.match(data, pos)
+    if m is None:
+        raise ValueError("Unterminated string at {0}".format(pos - 1))
+    return m.end()
+
+def skip_whitespace(data, pos):
+    """Return the position of the next character that isn't whitespace"""
+    return whitespace_regex.match(data, pos).end()
+
+def expect(data, pos, char):
+    """Complain if the character at pos isn't the one we expect"""
+    if data[pos:pos+1] != char:
+        raise ValueError("Expected {0!r} at {1}, got {2!r}".format(char, pos, data[pos:pos+1]))
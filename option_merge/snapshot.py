@@ -0,0 +1,493 @@
+"""
+A snapshot is a compact binary copy of a fully merged configuration that can
+be read back without merging anything.
+
+.. code-block:: python
+
+    from option_merge import snapshot
+
+    snapshot.dump(configuration, "/tmp/config.snapshot", files=["/path/to/config.yml"])
+
+    loaded = snapshot.Snapshot.load("/tmp/config.snapshot")
+    if loaded is not None:
+        loaded["some.key"]
+        loaded.source_for("some.key")
+
+The file is memory mapped when it is loaded and values are only decoded when
+they are accessed, so a lookup only reads the parts of the file it needs.
+
+A snapshot is considered stale, and ``load`` returns None, if any of the files
+it was made from have changed since it was made.
+
+The format is:
+
+* A header of the magic bytes, a fingerprint of the files the snapshot was made
+  from and the number of strings, keys, sources and files
+* The offsets of each string in the string table
+* A record of (key, value, first source, number of sources, parts) for each key,
+  sorted by the key
+* The indexes of the sources for each key
+* The indexes of the files the snapshot was made from
+* The strings, encoded as utf-8
+
+Keys are dot separated paths to each value that isn't a dictionary and values
+are stored as JSON. When a key in the configuration has a dot in it, the parts
+of the path are also stored as a JSON list so that key isn't split up.
+"""
+
+from option_merge.merge import MergedOptions
+from option_merge.joiner import dot_joiner
+
+import hashlib
+import struct
+import copy
+import mmap
+import json
+import os
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+MAGIC = b"OMSNAP02"
+
+header_struct = struct.Struct("<8s32sIIII")
+offset_struct = struct.Struct("<Q")
+record_struct = struct.Struct("<IIIII")
+index_struct = struct.Struct("<I")
+
+# The parts of a record for a key without any dots in its parts
+NO_PARTS = 0xFFFFFFFF
+
+class BadSnapshot(Exception):
+    """Raised when a snapshot can't be made or read"""
+
+def fingerprint(files):
+    """Return a digest of the location, size and modified time of these files"""
+    digest = hashlib.sha256()
+    for location in files:
+        digest.update(os.path.abspath(location).encode("utf-8"))
+        if os.path.exists(location):
+            stat = os.stat(location)
+            digest.update("{0}:{1}".format(stat.st_size, stat.st_mtime).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.digest()
+
+def flattened(options, ignore=None):
+    """
+    Yield (parts, value, sources) for every value in this MergedOptions
+
+    Where parts is the list of keys to the value and an empty dictionary is
+    yielded for any part of the configuration without keys.
+    """
+    def sources_for(current, key):
+        return current.storage.source_for(current.converted_path(key, ignore_converters=True))
+
+    stack = [([], options)]
+    while stack:
+        parents, current = stack.pop()
+        keys = sorted(current.keys(), key=str)
+        if not keys and parents:
+            yield parents, {}, sources_for(current, "")
+
+        for key in reversed(keys):
+            if not parents and ignore and key in ignore:
+                continue
+
+            parts = parents + [str(key)]
+            val = current[key]
+            if type(val) is MergedOptions:
+                stack.append((parts, val))
+            else:
+                yield parts, val, sources_for(current, key)
+
+def dumps(options, files=(), ignore=None, default=None):
+    """
+    Return the bytes of a snapshot of this MergedOptions
+
+    files
+        The files this configuration was made from. The snapshot is stale when
+        any of these change.
+
+    ignore
+        Top level keys to leave out of the snapshot
+
+    default
+        Passed into ``json.dumps`` for values that aren't JSON serializable
+    """
+    strings = []
+    string_indexes = {}
+    def string_index(string):
+        if string not in string_indexes:
+            string_indexes[string] = len(strings)
+            strings.append(string.encode("utf-8"))
+        return string_indexes[string]
+
+    records = []
+    source_indexes = []
+    for parts, val, sources in flattened(options, ignore=ignore):
+        path = dot_joiner(parts, list)
+        try:
+            encoded = json.dumps(val, sort_keys=True, default=default)
+        except (TypeError, ValueError) as error:
+            raise BadSnapshot("Couldn't serialize {0}: {1}".format(path, error))
+
+        parts_index = NO_PARTS
+        if any("." in part for part in parts):
+            parts_index = string_index(json.dumps(parts))
+
+        start = len(source_indexes)
+        source_indexes.extend(string_index(str(source)) for source in sources)
+        records.append((path, string_index(encoded), start, len(sources), parts_index))
+
+    records = [(string_index(path), value, start, count, parts_index) for path, value, start, count, parts_index in records]
+    records.sort(key=lambda record: strings[record[0]])
+    file_indexes = [string_index(os.path.abspath(location)) for location in files]
+
+    body = []
+    offset = 0
+    for string in strings:
+        body.append(offset_struct.pack(offset))
+        offset += len(string)
+    body.append(offset_struct.pack(offset))
+    body.extend(record_struct.pack(*record) for record in records)
+    body.extend(index_struct.pack(index) for index in source_indexes)
+    body.extend(index_struct.pack(index) for index in file_indexes)
+    body.extend(strings)
+
+    header = header_struct.pack(MAGIC, fingerprint(files), len(strings), len(records), len(source_indexes), len(file_indexes))
+    return header + b"".join(body)
+
+def dump(options, location, files=(), ignore=None, default=None):
+    """Write a snapshot of this MergedOptions to this location"""
+    tmp = "{0}.{1}.tmp".format(location, os.getpid())
+    with open(tmp, "wb") as fle:
+        fle.write(dumps(options, files=files, ignore=ignore, default=default))
+    os.rename(tmp, location)
+
+class Snapshot(object):
+    """
+    Read only access to a snapshot held in a buffer
+
+    The buffer may be anything that supports slicing into bytes and
+    ``struct.unpack_from``; i.e. bytes, a memoryview or an mmap.
+    """
+    @classmethod
+    def load(kls, location):
+        """
+        Return a Snapshot of the memory mapped file at this location
+
+        Or None if the file doesn't exist, is stale or isn't a whole snapshot,
+        so that a broken snapshot is treated like one that needs to be made
+        again.
+        """
+        if not os.path.exists(location):
+            return None
+
+        with open(location, "rb") as fle:
+            try:
+                buf = mmap.mmap(fle.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # The file is empty
+                return None
+
+        try:
+            snapshot = kls(buf)
+            if not snapshot.stale():
+                return snapshot
+        except (BadSnapshot, struct.error, UnicodeDecodeError):
+            pass
+
+        buf.close()
+        return None
+
+    def __init__(self, buf, prefix="", layout=None):
+        self.buf = buf
+        self.prefix = prefix
+        self.layout = layout
+        if self.layout is None:
+            self.layout = self.read_layout(buf)
+        self.__dict__.update(self.layout)
+
+    def read_layout(self, buf):
+        """Return a dictionary of the sizes and positions of each part of the snapshot"""
+        if len(buf) < header_struct.size:
+            raise BadSnapshot("Snapshot is too small")
+
+        magic, digest, num_strings, num_keys, num_sources, num_files = header_struct.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise BadSnapshot("Not a snapshot")
+
+        offsets_start = header_struct.size
+        records_start = offsets_start + (num_strings + 1) * offset_struct.size
+        sources_start = records_start + num_keys * record_struct.size
+        files_start = sources_start + num_sources * index_struct.size
+        strings_start = files_start + num_files * index_struct.size
+
+        if len(buf) < strings_start:
+            raise BadSnapshot("Snapshot is truncated")
+        strings_size = offset_struct.unpack_from(buf, offsets_start + num_strings * offset_struct.size)[0]
+        if len(buf) < strings_start + strings_size:
+            raise BadSnapshot("Snapshot is truncated")
+
+        return dict(
+              fingerprint=digest, num_keys=num_keys, num_files=num_files
+            , offsets_start=offsets_start, records_start=records_start, sources_start=sources_start
+            , files_start=files_start, strings_start=strings_start
+            , decoded={}, values={}
+            )
+
+    def stale(self):
+        """Say whether the files this snapshot was made from have changed"""
+        return fingerprint(self.files()) != self.fingerprint
+
+    def files(self):
+        """Return the files this snapshot was made from"""
+        return [self.string(self.index_at(self.files_start, i)) for i in range(self.num_files)]
+
+    ########################
+    ###   MAPPING
+    ########################
+
+    def __getitem__(self, path):
+        """
+        Return the value at this path
+
+        Or a Snapshot prefixed to this path if it has more keys underneath it
+        """
+        path = self.full_path(path)
+        index = self.find(path)
+        if index < self.num_keys and self.key_at(index) == path:
+            return self.value_at(index)
+
+        if any(self.relative_parts(index, path) for index in range(*self.bounds(path))):
+            return self.prefixed(path)
+        raise KeyError(path)
+
+    def prefixed(self, path):
+        """Return a Snapshot looking at this path of our buffer"""
+        return Snapshot(self.buf, prefix=path, layout=self.layout)
+
+    def get(self, path, default=None):
+        """Return the value at this path or the default"""
+        try:
+            return self[path]
+        except KeyError:
+            return default
+
+    def __contains__(self, path):
+        try:
+            self[path]
+            return True
+        except KeyError:
+            return False
+
+    def keys(self):
+        """Return the keys directly under our prefix"""
+        keys = []
+        seen = set()
+        for index in range(*self.bounds()):
+            parts = self.relative_parts(index)
+            if parts and parts[0] not in seen:
+                seen.add(parts[0])
+                keys.append(parts[0])
+        return keys
+
+    def items(self):
+        """Return [(key, value), ...] for the keys directly under our prefix"""
+        return [(key, self[key]) for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def source_for(self, path):
+        """Return the sources recorded for this path"""
+        path = self.full_path(path)
+        index = self.find(path)
+        if index < self.num_keys and self.key_at(index) == path:
+            _, _, start, count, _ = self.record_at(index)
+            return [self.string(self.index_at(self.sources_start, start + i)) for i in range(count)]
+
+        sources = []
+        for index in range(*self.bounds(path)):
+            if not self.relative_parts(index, path):
+                continue
+
+            _, _, start, count, _ = self.record_at(index)
+            for i in range(count):
+                source = self.string(self.index_at(self.sources_start, start + i))
+                if source not in sources:
+                    sources.append(source)
+        return sources
+
+    def as_dict(self):
+        """Return everything under our prefix as a dictionary"""
+        result = {}
+        for index in range(*self.bounds()):
+            parts = self.relative_parts(index)
+            if not parts:
+                continue
+
+            current = result
+            for part in parts[:-1]:
+                current = current.setdefault(part, {})
+            current[parts[-1]] = self.value_at(index)
+        return result
+
+    def __repr__(self):
+        return "Snapshot({0})".format(self.prefix)
+
+    ########################
+    ###   IMPLEMENTATION
+    ########################
+
+    def full_path(self, path):
+        """Return this path with our prefix"""
+        return dot_joiner([self.prefix, dot_joiner(path)], list)
+
+    def bounds(self, path=None):
+        """Return (start, end) indexes of the keys under this path"""
+        if path is None:
+            path = self.prefix
+        if not path:
+            return 0, self.num_keys
+
+        start = self.find(path + ".")
+        end = self.find(path + "/")
+        exact = self.find(path)
+        if exact < self.num_keys and self.key_at(exact) == path:
+            return exact, exact + 1
+        return start, end
+
+    def find(self, path):
+        """Return the index of the first key that is not less than this path"""
+        low, high = 0, self.num_keys
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < path:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def record_at(self, index):
+        return record_struct.unpack_from(self.buf, self.records_start + index * record_struct.size)
+
+    def index_at(self, start, index):
+        return index_struct.unpack_from(self.buf, start + index * index_struct.size)[0]
+
+    def key_at(self, index):
+        return self.string(self.record_at(index)[0])
+
+    def parts_at(self, index):
+        """Return the list of keys to the value at this index"""
+        record = self.record_at(index)
+        if record[4] == NO_PARTS:
+            return self.string(record[0]).split(".")
+        return json.loads(self.string(record[4]))
+
+    def relative_parts(self, index, path=None):
+        """
+        Return the parts of the key at this index after this path
+
+        Or None if the path ends part way into one of those parts. The path
+        defaults to our prefix.
+        """
+        parts = self.parts_at(index)
+        if path is None:
+            path = self.prefix
+        if not path:
+            return parts
+
+        length = -1
+        for i, part in enumerate(parts):
+            length += len(part) + 1
+            if length == len(path):
+                return parts[i+1:]
+            elif length > len(path):
+                return None
+
+    def value_at(self, index):
+        """
+        Decode the value for the key at this index
+
+        Each call gets its own copy of dictionaries and lists so changing them
+        doesn't change what we give out next time.
+        """
+        value_index = self.record_at(index)[1]
+        if value_index not in self.values:
+            self.values[value_index] = json.loads(self.string(value_index))
+
+        value = self.values[value_index]
+        if type(value) in (dict, list):
+            return copy.deepcopy(value)
+        return value
+
+    def string(self, index):
+        """Decode the string at this index of the string table"""
+        if index not in self.decoded:
+            start, end = struct.unpack_from("<QQ", self.buf, self.offsets_start + index * offset_struct.size)
+            self.decoded[index] = bytes(self.buf[self.strings_start + start:self.strings_start + end]).decode("utf-8")
+        return self.decoded[index]
+
+def attach(name, size):
+    """Return a SharedSnapshot for the shared memory with this name"""
+    if shared_memory is None:
+        raise BadSnapshot("Shared snapshots need multiprocessing.shared_memory")
+
+    try:
+        memory = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        memory = shared_memory.SharedMemory(name=name)
+    return SharedSnapshot(memory, size)
+
+class SharedSnapshot(Snapshot):
+    """
+    A Snapshot held in shared memory
+
+    When pickled, only the name of the shared memory is sent, so worker
+    processes read the one copy of the configuration rather than each getting
+    their own.
+
+    .. code-block:: python
+
+        shared = SharedSnapshot.create(configuration)
+        try:
+            with ProcessPoolExecutor() as executor:
+                executor.map(work, [shared] * 10)
+        finally:
+            shared.close()
+            shared.unlink()
+
+    The process that creates the snapshot is responsible for unlinking it.
+    """
+    @classmethod
+    def create(kls, options, files=(), ignore=None, default=None):
+        """Return a SharedSnapshot of this MergedOptions"""
+        if shared_memory is None:
+            raise BadSnapshot("Shared snapshots need multiprocessing.shared_memory")
+
+        data = dumps(options, files=files, ignore=ignore, default=default)
+        memory = shared_memory.SharedMemory(create=True, size=len(data))
+        memory.buf[:len(data)] = data
+        return kls(memory, len(data))
+
+    def __init__(self, memory, size):
+        self.size = size
+        self.memory = memory
+        super(SharedSnapshot, self).__init__(memory.buf)
+
+    def __reduce__(self):
+        return (attach, (self.memory.name, self.size))
+
+    def close(self):
+        """Stop looking at the shared memory"""
+        self.memory.close()
+
+    def unlink(self):
+        """Remove the shared memory"""
+        self.memory.unlink()
@@ -8,14 +8,19 @@ which can be used to get keys and values for some path.
 It is also used to get thesource for particular paths.
 """
 
-from option_merge.versioning import versioned_iterable, versioned_value
+from option_merge.versioning import versioned_iterable, versioned_value, cache_sizes
 from option_merge.merge import MergedOptions
+from option_merge import merge
 from option_merge.not_found import NotFound
 from option_merge.value_at import value_at
 from option_merge.joiner import dot_joiner
 from option_merge import helper as hp
 from option_merge.path import Path
 
+import weakref
+import copy
+import six
+
 class DataPath(object):
     """
     Encapsulates a (path, data, source) triplet and getting keys and values from
@@ -84,17 +89,35 @@ class DataPath(object):
                     yield key, data, []
                 return
 
-            found = False
-            for key in reversed(sorted(data.keys(), key=len)):
-                if prefix.startswith(key):
-                    data = data[key]
-                    prefix = prefix.without(key)
-                    found = True
-                    break
-
-            if not found:
+            key = self.longest_key_starting(prefix, data)
+            if key is None:
                 raise NotFound
 
+            data = data[key]
+            prefix = prefix.without(key)
+
+    def longest_key_starting(self, prefix, data):
+        """
+        Return the longest key in data that the prefix starts with
+
+        We look for each string the prefix starts with, from longest to
+        shortest, rather than sorting all the keys in the data.
+        """
+        keys = data if type(data) is dict else set(data.keys())
+
+        if prefix.path_is_string:
+            text = prefix.path
+        elif not prefix.path:
+            return "" if "" in keys else None
+        elif prefix.path_type is list and len(prefix.path) == 1:
+            text = prefix.path[0]
+        else:
+            text = prefix.joined()
+
+        for end in range(len(text), -1, -1):
+            if text[:end] in keys:
+                return text[:end]
+
     def keys_after(self, prefix):
         """Yield the keys after this prefix"""
         for key, _, _ in self.items(prefix):
@@ -112,6 +135,78 @@ class DataPath(object):
                 else:
                     return data
 
+class LazyData(object):
+    """
+    Data for a layer that is only loaded the first time we look inside it
+
+    .. code-block:: python
+
+        storage.add(Path(["tasks", "deploy"]), LazyData(functools.partial(read_yaml, "tasks/deploy.yml")), source="tasks/deploy.yml")
+
+    Looking at keys above the prefix of the layer doesn't load the data, but
+    anything that looks at or below that prefix will. The loaded data is kept.
+
+    Once loaded, only the data is pickled. Until then the loader is pickled,
+    so it needs to be something that can be pickled, rather than a lambda.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+
+    def __getstate__(self):
+        """Pickle our data if we have it, otherwise our loader"""
+        if self.is_loaded:
+            return {"data": self.data}
+        return {"loader": self.loader}
+
+    def __setstate__(self, state):
+        """Restore our data or our loader"""
+        self.loader = state.get("loader")
+        if "data" in state:
+            self.data = state["data"]
+
+    def __repr__(self):
+        return "<LazyData({0})>".format("loaded" if self.is_loaded else "not loaded")
+
+    @property
+    def is_loaded(self):
+        return "data" in self.__dict__
+
+    def load(self):
+        """Return our data, calling the loader if we haven't yet"""
+        if not self.is_loaded:
+            self.data = self.loader()
+        return self.data
+
+class Layer(tuple):
+    """
+    A (path, data, source) triplet in a Storage
+
+    A frozen layer is one whose data we are promised will never change, which
+    means we can remember things about that data.
+
+    A simple layer is one whose data is a dictionary where all the keys in it
+    and in the dictionaries inside it are strings without dots. Looking for a
+    path in a simple layer is one lookup per part of the path. This is worked
+    out when the layer is made unless it is given to us.
+    """
+
+    def __new__(cls, path, data, source=None, frozen=False, simple=None):
+        layer = super(Layer, cls).__new__(cls, (path, data, source))
+        layer.frozen = frozen
+        layer.simple = hp.has_simple_keys(data) if simple is None else simple
+        return layer
+
+    def __getnewargs__(self):
+        return tuple(self) + (self.frozen, )
+
+    def holds_options(self):
+        """Return whether the dictionaries in our data hold any MergedOptions, remembering the answer"""
+        holds = self.__dict__.get("_holds_options")
+        if holds is None:
+            holds = self._holds_options = hp.holds_options(self[1])
+        return holds
+
 class Storage(object):
     """
     Holds the data used by MergedOptions.
@@ -119,23 +214,169 @@ class Storage(object):
     It understands the different sources of data that makes up the whole, how to
     get information for particular paths, how to delete particular paths, and
     how to get the sources for particular paths.
+
+    A storage may be created as an overlay of a ``parent`` storage. In that case
+    ``data`` only holds what was added to the overlay and the layers of the
+    parent are looked at after our own. (see ``overlay``)
+
+    Deleting from inside the dictionaries in our layers doesn't change those
+    dictionaries. Instead ``deleted`` holds ``(layer, keys)`` tombstones and
+    the layers we give out have copies of the data with those keys removed.
+    (see ``layers``)
     """
 
-    def __init__(self):
+    def __init__(self, parent=None):
         self.data = []
+        self.parent = parent
         self.deleted = []
         self._version = -1
 
+        # Incremented whenever a source_for we are part of stops at a circular reference
+        self.cycles_cut = 0
+
+    def __getstate__(self):
+        """Pickle our data without any of the caches"""
+        return dict((key, val) for key, val in self.__dict__.items() if not key.startswith("_") or key == "_version")
+
     ########################
     ###   USAGE
     ########################
 
-    def add(self, path, data, source=None):
-        """Add data at the beginning"""
+    def add(self, path, data, source=None, frozen=False, dedupe=False):
+        """
+        Add data at the beginning
+
+        If frozen is True then the data must never be changed by anything else,
+        and we remember the order we look at the keys in its dictionaries.
+
+        If dedupe is True then the data is also frozen and any dictionaries and
+        lists in it that are identical to ones we have deduped before are
+        replaced with those, so we only hold one copy of them.
+        """
         if not isinstance(path, Path):
             raise Exception("Path should be a Path object\tgot={0}".format(type(path)))
+        if dedupe:
+            data = self.interned(data)
+            frozen = True
         self._version += 1
-        self.data.insert(0, (path, data, source))
+        self.data.insert(0, Layer(path, data, source, frozen=frozen))
+
+    def interned(self, data):
+        """Return data with dictionaries and lists shared with the other data we have deduped"""
+        table = getattr(self, "_interned", None)
+        if table is None:
+            table = self._interned = {}
+        return hp.interned(data, table)
+
+    def overlay(self):
+        """
+        Return a new storage that looks at our layers after its own
+
+        Anything added to the new storage doesn't affect this storage, whilst
+        changes to this storage are seen by the overlay.
+        """
+        return self.__class__(parent=self)
+
+    def view(self, key, make):
+        """
+        Return the view we have for this key, or make one with ``make``
+
+        We only hold weak references to these views, so they are forgotten
+        when nothing else is using them.
+        """
+        views = getattr(self, "_views", None)
+        if views is None:
+            views = self._views = weakref.WeakValueDictionary()
+
+        view = views.get(key)
+        if view is None:
+            view = views[key] = make()
+        return view
+
+    def views(self):
+        """Return the views we have made that are still being used"""
+        views = getattr(self, "_views", None)
+        if views is None:
+            return []
+        return list(views.values())
+
+    def stats(self):
+        """
+        Return a dictionary describing what we hold on to
+
+        layers
+            A list of {prefix, source, keys, frozen, lazy} for each of our own
+            layers, where keys is the number of values in that layer. This is
+            None for lazy layers that haven't been loaded yet.
+
+        duplicates
+            {path: number of layers} for values that more than one layer has
+
+        caches
+            {name: size} for each of our caches
+
+        tombstones and views
+            How many of each we have
+        """
+        effective = self.effective_layers() if self.deleted else {}
+
+        layers = []
+        counts = {}
+        for layer in self.data:
+            path, data, source = effective.get(id(layer), layer)
+            lazy = type(data) is LazyData
+            keys = None
+            if not lazy or data.is_loaded:
+                keys = 0
+                for joined in self.leaf_paths(self.loaded(data), dot_joiner(path)):
+                    counts[joined] = counts.get(joined, 0) + 1
+                    keys += 1
+
+            layers.append({"prefix": dot_joiner(path), "source": source, "keys": keys, "frozen": layer.frozen, "lazy": lazy})
+
+        caches = cache_sizes(self)
+        for name in ("_source_index", "_as_dict_cache", "_frozen_keys"):
+            caches[name] = len(getattr(self, name, None) or {})
+
+        return {
+              "layers": layers
+            , "duplicates": dict((joined, count) for joined, count in counts.items() if count > 1)
+            , "caches": caches
+            , "tombstones": len(self.deleted)
+            , "views": len(self.views())
+            }
+
+    def leaf_paths(self, data, prefix):
+        """Yield the joined path to every value in this data that isn't a dictionary"""
+        stack = [(prefix, data)]
+        while stack:
+            prefix, data = stack.pop()
+            if type(data) is MergedOptions:
+                data = data.as_dict()
+
+            if type(data) is dict or getattr(data, "is_dict", False) is True:
+                for key, val in data.items():
+                    stack.append(("{0}.{1}".format(prefix, key) if prefix else str(key), val))
+            else:
+                yield prefix
+
+    def layers(self):
+        """
+        Yield (path, data, source) for our data followed by that of our parent
+
+        Layers we have deleted from are given with the deletions applied.
+        """
+        if self.deleted:
+            effective = self.effective_layers()
+            for layer in self.data:
+                yield effective.get(id(layer), layer)
+        else:
+            for layer in self.data:
+                yield layer
+
+        if self.parent is not None:
+            for layer in self.parent.layers():
+                yield layer
 
     def get(self, path):
         """Get a single value from a path"""
@@ -143,52 +384,342 @@ class Storage(object):
             return info.data
         raise KeyError(path)
 
+    def first_values(self, paths):
+        """
+        Return {joined_path: value} of the first value found for each path
+
+        Paths that aren't found are left out of the result.
+
+        Each layer is looked at once for all the paths and layers with a prefix
+        are only looked at for the paths that start with the same key.
+        """
+        pending = {}
+        groups = {}
+        for path in paths:
+            path = Path.convert(path)
+            joined = path.joined()
+            if joined not in pending and self.might_have(path):
+                pending[joined] = path
+                groups.setdefault(joined.split(".", 1)[0], []).append(joined)
+
+        found = {}
+        for layer in self.layers():
+            if not pending:
+                break
+            info_path, data, source = layer
+
+            first = dot_joiner(info_path).split(".", 1)[0]
+            for group, joineds in groups.items():
+                if first and group and first != group:
+                    continue
+
+                for joined in list(joineds):
+                    path = pending[joined]
+                    for full_path, _, val in self.determine_path_and_val(path, info_path, data, source, frozen=getattr(layer, "frozen", False), simple=getattr(layer, "simple", False)):
+                        try:
+                            found[joined] = DataPath(full_path, val, source).value_after(path)
+                        except NotFound:
+                            continue
+
+                        del pending[joined]
+                        joineds.remove(joined)
+                        break
+
+        return found
+
     def source_for(self, path, chain=None):
-        """Find all the sources for a given path"""
-        sources = []
+        """
+        Find all the sources for a given path
+
+        The sources for each path are remembered until our version changes.
+        Sources found whilst cutting short a circular reference aren't
+        remembered, as they depend on where we started looking from.
+        """
         if chain is None:
             chain = []
         if (path, self) in chain:
+            for _, storage in chain:
+                storage.cycles_cut += 1
             return []
         if not path:
             return []
 
+        joined = dot_joiner(path)
+        index = self.source_index()
+        if index is not None and joined in index:
+            return list(index[joined])
+
+        cycles_cut = self.cycles_cut
+
+        sources = []
+        seen = set()
         for info in self.get_info(path, ignore_converters=True, chain=chain + [(path, self)]):
+            if info.path != path:
+                continue
+
             source = info.source
             if callable(info.source):
                 source = info.source()
 
-            if info.path == path:
-                if source not in sources and source:
-                    if isinstance(source, list):
-                        for s in source:
-                            if s not in sources:
-                                sources.append(s)
-                    else:
-                        sources.append(source)
+            self.extend_sources(sources, seen, source)
 
+        if index is not None and cycles_cut == self.cycles_cut:
+            index[joined] = tuple(sources)
         return sources
 
+    def source_map(self, prefix="", chain=None):
+        """
+        Return {joined_path: [sources]} for every path under this prefix
+
+        This is equivalent to calling ``source_for`` for every path we know
+        about, except each layer is only walked once for all of them.
+        """
+        result = {}
+        seens = {}
+        for joined, source in self.walk_sources(prefix, chain=chain):
+            if joined not in result:
+                result[joined] = []
+                seens[joined] = set()
+            self.extend_sources(result[joined], seens[joined], source)
+        return result
+
+    def walk_sources(self, prefix="", chain=None):
+        """
+        Yield (joined_path, source) for every path in every layer under this prefix
+
+        Layers are walked from newest to oldest, so the sources for each path
+        come out in the same order ``source_for`` would return them.
+
+        Paths inside a MergedOptions layer get the sources from that
+        MergedOptions, falling back to the source of the layer.
+        """
+        if chain is None:
+            chain = []
+        if self in chain:
+            return
+        chain = chain + [self]
+
+        prefix = dot_joiner(prefix)
+        def wanted(joined):
+            return not prefix or joined == prefix or joined.startswith(prefix + ".")
+        def leads_to_prefix(joined):
+            return not joined or wanted(joined) or prefix.startswith(joined + ".")
+
+        for info_path, data, source in self.layers():
+            joined_info = dot_joiner(info_path)
+            if not leads_to_prefix(joined_info):
+                continue
+            data = self.loaded(data)
+
+            head = source
+            nested = None
+            if type(data) is MergedOptions and data.storage not in chain:
+                nested = self.nested_sources(data, chain)
+                if data.prefix_string:
+                    head = nested.pop("", None) or source
+
+            parts = joined_info.split(".") if joined_info else []
+            for i in range(1, len(parts) + 1):
+                joined = ".".join(parts[:i])
+                if wanted(joined):
+                    yield joined, head
+
+            stack = [(joined_info, data)]
+            while stack:
+                joined, data = stack.pop()
+                if type(data) is MergedOptions:
+                    if data.storage in chain:
+                        continue
+                    get = lambda key: data.get(key, ignore_converters=True)
+                elif type(data) is dict or isinstance(data, dict) or getattr(data, "is_dict", False) is True:
+                    get = data.__getitem__
+                else:
+                    continue
+
+                for key in data.keys():
+                    path = "{0}.{1}".format(joined, key) if joined else str(key)
+                    if leads_to_prefix(path):
+                        if wanted(path):
+                            if nested is None:
+                                yield path, source
+                            else:
+                                yield path, nested.get(path[len(joined_info):].lstrip("."), None) or source
+                        stack.append((path, get(key)))
+
+    def nested_sources(self, options, chain):
+        """Return {path: [sources]} for this MergedOptions relative to its prefix"""
+        prefix = options.prefix_string
+        found = options.storage.source_map(prefix, chain=chain)
+        if not prefix:
+            return found
+
+        result = {}
+        for joined, sources in found.items():
+            result[joined[len(prefix)+1:]] = sources
+        return result
+
+    def extend_sources(self, sources, seen, source):
+        """Add this source (or list of sources) to sources if we haven't seen it yet"""
+        if not source:
+            return
+
+        for s in (source if isinstance(source, list) else [source]):
+            try:
+                if s in seen:
+                    continue
+                seen.add(s)
+            except TypeError:
+                if s in sources:
+                    continue
+            sources.append(s)
+
+    def source_index(self):
+        """
+        Return the {joined_path: sources} we know for our current version
+
+        The index is also forgotten when any MergedOptions we hold as a layer
+        changes, as the sources in it come from those.
+
+        Or None if our version says we shouldn't be caching
+        """
+        version = self.version
+        if version == -1:
+            return None
+
+        nested = getattr(self, "_source_index_nested", None)
+        if getattr(self, "_source_index_version", None) != version or any(storage.change_key() != change_key for storage, change_key in nested):
+            nested = self.nested_storages()
+            if nested is None:
+                self._source_index_version = None
+                return None
+
+            self._source_index = {}
+            self._source_index_version = version
+            self._source_index_nested = [(storage, storage.change_key()) for storage in nested]
+        return self._source_index
+
     def delete(self, path):
         """Delete the first instance of some path"""
-        for index, (info_path, data, _) in enumerate(self.data):
+        self.delete_many([path])
+
+    def delete_many(self, paths):
+        """
+        Delete the first instance of each path in turn
+
+        This is the same as calling ``delete`` for each path, except our layers
+        are indexed by the first part of their path once for all the paths, so
+        that each delete only looks at the layers that may hold that path.
+
+        Paths we don't have are deleted from our parent if we have one,
+        otherwise a KeyError is raised for the first of them.
+        """
+        positions = {}
+        index = {}
+        for position, layer in enumerate(self.data):
+            positions[id(layer)] = position
+            index.setdefault(dot_joiner(layer[0]).split(".", 1)[0], []).append(layer)
+
+        removed = set()
+        def flush():
+            if removed:
+                self.data[:] = [layer for layer in self.data if id(layer) not in removed]
+                if self.deleted:
+                    self.deleted[:] = [(layer, keys) for layer, keys in self.deleted if id(layer) not in removed]
+
+        missing = []
+        try:
+            for path in paths:
+                joined = dot_joiner(path)
+                layers = [layer for layer in index.get(joined.split(".", 1)[0], []) + index.get("", []) if id(layer) not in removed]
+                layers.sort(key=lambda layer: positions[id(layer)])
+                if not self.delete_from_layers(path, joined, layers, removed, flush):
+                    missing.append(path)
+        finally:
+            flush()
+
+        if missing:
+            if self.parent is None:
+                raise KeyError(missing[0])
+            self.parent.delete_many(missing)
+
+    def delete_from_layers(self, path, joined, layers, removed, flush):
+        """
+        Delete the first instance of this path from these layers
+
+        Layers that are removed are added to ``removed`` and ``flush`` is used
+        to remove them from our data before deleting from a MergedOptions,
+        which may be looking at this storage.
+        """
+        effective = self.effective_layers() if self.deleted else {}
+        for layer in layers:
+            info_path, data, _ = effective.get(id(layer), layer)
             dotted_info_path = dot_joiner(info_path)
-            if dotted_info_path == path:
+            if dotted_info_path == joined or dotted_info_path.startswith("{0}.".format(joined)):
                 self._version += 1
-                del self.data[index]
-                return
-            elif dotted_info_path.startswith("{0}.".format(path)):
-                self._version += 1
-                del self.data[index]
-                return
-            elif not dotted_info_path or path.startswith("{0}.".format(dotted_info_path)):
+                removed.add(id(layer))
+                return True
+            elif not dotted_info_path or joined.startswith("{0}.".format(dotted_info_path)):
                 remainder = path
                 if info_path:
                     remainder = Path.convert(path).without(dotted_info_path)
-                if self.delete_from_data(data, remainder):
-                    return
 
-        raise KeyError(path)
+                data = self.loaded(data)
+                if type(data) is MergedOptions:
+                    flush()
+                if self.delete_from_data(data, remainder, layer=layer):
+                    return True
+
+        return False
+
+    def compact(self):
+        """
+        Replace our layers with a smaller number of equivalent layers
+
+        * Layers holding a MergedOptions without converters are replaced with
+          the layers of that MergedOptions
+        * Adjacent dictionaries at the same prefix with the same source are
+          merged together if they don't provide the same keys
+
+        Layers that would lose information about their sources are left alone.
+        """
+        layers = []
+        for original, layer in zip(self.data, self.layers()):
+            if layer is not original and getattr(original, "frozen", False):
+                # Our copy of a frozen layer we deleted from isn't changed once our tombstones are gone
+                layer = Layer(layer[0], layer[1], layer[2], frozen=True, simple=layer.simple)
+            layers.append(layer)
+
+        changed = True
+        while changed:
+            changed = False
+            inlined = []
+            for layer in layers:
+                replacement = self.inlined_layers(*layer)
+                if replacement is None:
+                    inlined.append(layer)
+                else:
+                    inlined.extend(replacement)
+                    changed = True
+            layers = inlined
+
+        compacted = []
+        for layer in layers:
+            info_path, data, source = layer
+            if compacted:
+                previous = compacted[-1]
+                previous_path, previous_data, previous_source = previous
+                if previous_source == source and dot_joiner(previous_path) == dot_joiner(info_path):
+                    combined = self.combined_data(previous_data, data)
+                    if combined is not None:
+                        frozen = getattr(previous, "frozen", False) and getattr(layer, "frozen", False)
+                        compacted[-1] = Layer(previous_path, combined, source, frozen=frozen)
+                        continue
+            compacted.append(layer)
+
+        if self.deleted or len(compacted) != len(self.data) or any(a is not b for a, b in zip(compacted, self.data)):
+            self._version += 1
+            self.data[:] = compacted
+            self.deleted[:] = []
 
     ########################
     ###   IMPLEMENTATION
@@ -196,26 +727,41 @@ class Storage(object):
 
     @property
     def version(self):
+        if self.parent is not None:
+            parent_version = self.parent.version
+            if parent_version == -1:
+                return -1
+            return [self._version] + [getattr(item, "version", 0) for item in self.data] + parent_version
+
         if self._version > 0:
             return [self._version] + [getattr(item, "version", 0) for item in self.data]
         else:
             return -1
 
     @versioned_iterable
-    def get_info(self, path, ignore_converters=False, chain=None):
-        """Yield DataPath objects for this path in the data"""
+    def get_info(self, path, ignore_converters=False, chain=None, keys_only=False):
+        """
+        Yield DataPath objects for this path in the data
+
+        If keys_only is True then only the keys of the data are going to be
+        looked at. (see ``determine_path_and_val``)
+        """
         yielded = False
-        if not self.data:
+        if not self.has_layers():
             return
 
         if chain is None:
             chain = []
 
+        if not self.might_have(path):
+            raise KeyError(path)
+
         ignore_converters = ignore_converters or getattr(path, 'ignore_converters', False)
         path = Path.convert(path).ignoring_converters(ignore_converters)
 
-        for info_path, data, source in self.data:
-            for full_path, found_path, val in self.determine_path_and_val(path, info_path, data, source):
+        for layer in self.layers():
+            info_path, data, source = layer
+            for full_path, found_path, val in self.determine_path_and_val(path, info_path, data, source, frozen=getattr(layer, "frozen", False), simple=getattr(layer, "simple", False), keys_only=keys_only):
                 source = self.make_source_for_function(data, found_path, chain, default=source)
                 yield DataPath(full_path, val, source)
                 yielded = True
@@ -223,42 +769,202 @@ class Storage(object):
         if not yielded:
             raise KeyError(path)
 
-    def determine_path_and_val(self, path, info_path, data, source):
+    def has_layers(self):
+        """Return whether we, or any of our parents, have any layers"""
+        if self.data:
+            return True
+        return self.parent is not None and self.parent.has_layers()
+
+    def might_have(self, path):
+        """
+        Return whether any of our layers could have a value at this path
+
+        A False answer means the path is definitely missing, so lookups can
+        give up without looking through every layer.
+        """
+        joined = dot_joiner(path)
+        if not joined:
+            return True
+
+        known = self.known_paths()
+        if known is None:
+            return True
+
+        paths, open_prefixes = known
+        if joined in paths:
+            return True
+
+        if open_prefixes:
+            if "" in open_prefixes:
+                return True
+
+            end = joined.find(".")
+            while end != -1:
+                if joined[:end] in open_prefixes:
+                    return True
+                end = joined.find(".", end + 1)
+
+        if self.parent is not None:
+            return self.parent.might_have(path)
+        return False
+
+    def known_paths(self):
+        """
+        Return (paths, open_prefixes) for our own layers, or None if we aren't caching
+
+        paths is every joined path that leads to a value in our layers, and
+        open_prefixes are the prefixes of layers, or of values in them, that
+        look after their own keys, like a MergedOptions or lazy data that isn't
+        loaded yet.
+
+        Only frozen layers have their keys indexed, as the dictionaries in other
+        layers may be changed after they are added. The prefix of any other
+        layer is open.
+
+        Adding layers only indexes the new layers. Deleting doesn't take paths
+        out of the index, which is fine as a deleted path is then looked for
+        properly.
+        """
+        version = self.version
+        if version == -1:
+            return None
+
+        known = getattr(self, "_known_paths", None)
+        if known is not None and known[0] == version:
+            return known[2], known[3]
+
+        data = self.data
+        indexed = ()
+        paths = set()
+        open_prefixes = set()
+        if known is not None:
+            _, indexed, paths, open_prefixes = known
+            kept = data[len(data)-len(indexed):] if len(indexed) <= len(data) else []
+            if len(kept) != len(indexed) or any(one is not two for one, two in zip(kept, indexed)):
+                indexed = ()
+                paths = set()
+                open_prefixes = set()
+
+        for layer in data[:len(data)-len(indexed)]:
+            self.index_layer(layer, paths, open_prefixes)
+
+        self._known_paths = (version, tuple(data), paths, open_prefixes)
+        return paths, open_prefixes
+
+    def index_layer(self, layer, paths, open_prefixes):
+        """Add the paths that lead to values in this layer to paths and open_prefixes"""
+        path, data, _ = layer
+        prefix = dot_joiner(path)
+        self.add_known_path(prefix, paths)
+
+        if not getattr(layer, "frozen", False):
+            open_prefixes.add(prefix)
+            return
+
+        if type(data) is LazyData:
+            if not data.is_loaded:
+                open_prefixes.add(prefix)
+                return
+            data = data.load()
+
+        stack = [(prefix, data)]
+        while stack:
+            prefix, data = stack.pop()
+            if type(data) is dict:
+                for key, val in data.items():
+                    key = str(key)
+                    joined = "{0}.{1}".format(prefix, key) if prefix else key
+                    if "." in key:
+                        self.add_known_path(joined, paths)
+                    else:
+                        paths.add(joined)
+                    stack.append((joined, val))
+            elif isinstance(data, dict) or getattr(data, "is_dict", False) is True:
+                open_prefixes.add(prefix)
+
+    def add_known_path(self, joined, paths):
+        """Add this joined path and the paths before each dot in it"""
+        end = joined.find(".")
+        while end != -1:
+            paths.add(joined[:end])
+            end = joined.find(".", end + 1)
+        paths.add(joined)
+
+    def determine_path_and_val(self, path, info_path, data, source, frozen=False, simple=False, keys_only=False):
         """
         Yield the full_path, found_path and val for this path into this data and info_path
 
         Where found_path is the path relative to the data
+
+        If the data is frozen, we use the keys we remember for its dictionaries.
+        If the data is simple, we look up each part of the path directly.
+
+        If keys_only is True then only the keys of val are going to be used and
+        lazy data for an info_path past our path isn't loaded.
         """
+        keys_for = self.frozen_keys if frozen else None
         joined_path = dot_joiner(path)
         joined_info_path = dot_joiner(info_path)
         if joined_path == joined_info_path:
-            yield info_path, "", data
+            yield info_path, "", self.loaded(data)
             return
 
         try:
+            if not info_path or joined_path.startswith(joined_info_path + '.'):
+                data = self.loaded(data)
+
             if not info_path:
-                found_path, val = value_at(data, Path.convert(path), self)
+                found_path, val = value_at(data, Path.convert(path), self, keys_for=keys_for, simple=simple)
                 yield info_path + found_path, dot_joiner(found_path, list), val
                 return
 
             if joined_path.startswith(joined_info_path + '.'):
                 get_at = Path.convert(path).without(info_path)
-                found_path, val = value_at(data, get_at, self)
+                found_path, val = value_at(data, get_at, self, keys_for=keys_for, simple=simple)
                 yield info_path + found_path, dot_joiner(found_path), val
                 return
 
             # We are only part way into info_path
             path = Path.convert(path)
             for key, data, short_path in DataPath(Path.convert(info_path), data, source).items(path, want_one=True):
-                yield path, "", hp.make_dict(key, short_path, data)
+                yield path, "", hp.make_dict(key, short_path, data if keys_only else self.loaded(data))
         except NotFound:
             pass
 
+    def frozen_keys(self, data):
+        """
+        Return the keys of this dictionary from a frozen layer in the order value_at looks at them
+
+        Longest keys are first so that keys with dots in them are found before
+        the keys they start with.
+
+        These are forgotten when our layers, or those of our parent, change so
+        we don't hold onto dictionaries from layers we no longer have.
+        """
+        change_key = self.change_key()
+        frozen = getattr(self, "_frozen_keys", None)
+        if frozen is None or self._frozen_keys_change_key != change_key:
+            frozen = self._frozen_keys = {}
+            self._frozen_keys_change_key = change_key
+
+        found = frozen.get(id(data))
+        if found is None:
+            # We hold onto the data so its id isn't reused
+            found = frozen[id(data)] = (data, list(reversed(sorted(data.keys(), key=lambda d: len(str(d))))))
+        return found[1]
+
+    def loaded(self, data):
+        """Return the data in a LazyData, loading it if need be, or the data as is"""
+        if type(data) is LazyData:
+            return data.load()
+        return data
+
     def make_source_for_function(self, data, path, chain, default=None):
         """Return us a function that will get the source for some path on the specified obj"""
         def source_for():
-            if hasattr(data, "source_for"):
-                nxt = data.source_for(data.converted_path(path), chain)
+            obj = self.loaded(data)
+            if hasattr(obj, "source_for"):
+                nxt = obj.source_for(obj.converted_path(path), chain)
                 if nxt:
                     return nxt
             return default
@@ -269,7 +975,7 @@ class Storage(object):
         """Get all the keys after this path"""
         done = set()
         stopped = set()
-        for info in self.get_info(path, ignore_converters=ignore_converters):
+        for info in self.get_info(path, ignore_converters=ignore_converters, keys_only=True):
             if hasattr(info.data, "storage") and info.data.storage is self:
                 continue
 
@@ -290,24 +996,237 @@ class Storage(object):
             if not info.is_dict:
                 stopped.add(dot_joiner(info.path))
 
-    def delete_from_data(self, data, path):
-        """Delete this path from the data"""
+    def inlined_layers(self, info_path, data, source):
+        """
+        Return the layers that can replace this MergedOptions layer
+
+        Or None if the data can't be replaced
+        """
+        if type(data) is not MergedOptions or data.storage is self or not data.converters.empty():
+            return None
+
+        layers = []
+        prefix = data.prefix_string
+        for layer in data.storage.layers():
+            nested_path, nested_data, nested_source = layer
+            if source and not nested_source:
+                return None
+
+            if prefix:
+                joined = dot_joiner(nested_path)
+                if joined == prefix or joined.startswith(prefix + "."):
+                    nested_path = Path.convert(nested_path).without(prefix)
+                elif not joined or prefix.startswith(joined + "."):
+                    remainder = prefix[len(joined):].lstrip(".").split(".")
+                    while remainder and type(nested_data) is dict:
+                        if any("." in str(key) for key in nested_data):
+                            return None
+                        nested_data = nested_data.get(remainder.pop(0), NotFound)
+
+                    if nested_data is NotFound:
+                        continue
+                    elif remainder:
+                        return None
+                    nested_path = Path([])
+                else:
+                    continue
+
+            layers.append(Layer(info_path + nested_path, nested_data, nested_source, frozen=getattr(layer, "frozen", False)))
+        return layers
+
+    def combined_data(self, newer, older):
+        """
+        Return a dictionary combining these two dictionaries
+
+        Or None if they both provide the same value or use keys with dots in them
+        """
+        if type(newer) is not dict or type(older) is not dict:
+            return None
+
+        combined = {}
+        for key, val in older.items():
+            if "." in str(key):
+                return None
+            combined[key] = val
+
+        for key, val in newer.items():
+            if "." in str(key):
+                return None
+
+            if key in combined:
+                val = self.combined_data(val, combined[key])
+                if val is None:
+                    return None
+            combined[key] = val
+
+        return combined
+
+    def delete_from_data(self, data, path, layer=None, keys=()):
+        """
+        Delete this path from the data
+
+        A key that is the whole path is deleted before looking for keys that are
+        a prefix of the path, longest prefix first.
+
+        If the data is from one of our layers, then the keys to what is deleted
+        are recorded as a tombstone for that layer instead of changing the data.
+        MergedOptions are always deleted from directly.
+        """
         if not path or (type(data) not in (dict, MergedOptions) and not isinstance(data, dict)):
             return False
 
-        keys = list(reversed(sorted(data.keys())))
-        if path in keys:
-            self._version += 1
-            del data[path]
+        if type(data) is MergedOptions:
+            layer = None
+            found = set(data.keys())
+        else:
+            found = data
+
+        joined = dot_joiner(path)
+        if path in found:
+            if layer is None:
+                self._version += 1
+                del data[path]
+            else:
+                self.tombstone(layer, keys + (joined, ))
             return True
 
-        for key in keys:
-            if path.startswith("{0}.".format(key)):
-                if self.delete_from_data(data[key], Path.convert(path).without(key)):
+        end = joined.rfind(".")
+        while end > 0:
+            key = joined[:end]
+            if key in found:
+                if self.delete_from_data(data[key], Path.convert(path).without(key), layer=layer, keys=keys + (key, )):
                     return True
+            end = joined.rfind(".", 0, end)
+
+        return False
+
+    def tombstone(self, layer, keys):
+        """Record that the value at these keys is deleted from the data in this layer"""
+        effective = self.effective_layers()
+        self._version += 1
+        self.deleted.append((layer, keys))
+        self.apply_tombstone(effective, layer, keys)
+        self._effective_count = len(self.deleted)
+
+    def effective_layers(self):
+        """
+        Return {id(layer): layer} for the layers we have deleted from
+
+        Where each layer has a copy of the data with our tombstones applied.
+        The copies share everything that wasn't on the way to a deleted key.
+        """
+        effective = getattr(self, "_effective", None)
+        if effective is None or self._effective_count != len(self.deleted):
+            effective = self._effective = {}
+            self._owned = {}
+            for layer, keys in self.deleted:
+                self.apply_tombstone(effective, layer, keys)
+            self._effective_count = len(self.deleted)
+        return effective
+
+    def apply_tombstone(self, effective, layer, keys):
+        """
+        Remove these keys from our copy of the data in this layer
+
+        Dictionaries are only copied the first time we need to change them and
+        we hold onto those copies so that their ids aren't reused.
+        """
+        path, data, source = effective.get(id(layer), layer)
+        data = self.loaded(data)
+        owned = self._owned
+
+        parent = None
+        current = data
+        for key in (None, ) + keys[:-1]:
+            if key is not None:
+                parent = current
+                current = current[key]
+
+            if id(current) not in owned:
+                current = copy.copy(current)
+                owned[id(current)] = current
+                if parent is None:
+                    data = current
+                else:
+                    parent[key] = current
+
+        del current[keys[-1]]
+        effective[id(layer)] = Layer(path, data, source, simple=getattr(layer, "simple", False))
 
     def as_dict(self, path, seen=None, ignore=None):
-        """Return this path as a single dictionary"""
+        """
+        Return this path as a single dictionary
+
+        Results are remembered for each path until our version, or that of
+        any storage the merge went into, changes. Each call gets its own copy of
+        the dictionaries in the result.
+        """
+        if seen is not None:
+            return self.merged_dict(path, seen=seen, ignore=ignore)
+
+        cache = self.as_dict_cache()
+        if cache is None:
+            return self.merged_dict(path, ignore=ignore)
+
+        key = (dot_joiner(path), getattr(path, "ignore_converters", False), tuple(ignore or ()))
+        found = cache.get(key)
+        if found is None or any(storage.change_key() != change_key for storage, change_key in found[1]):
+            result = self.merged_dict(path, ignore=ignore)
+            nested = self.nested_storages()
+            if nested is None:
+                return result
+            found = cache[key] = (result, [(storage, storage.change_key()) for storage in nested])
+        return hp.copy_dicts(found[0])
+
+    def nested_storages(self, chain=None):
+        """
+        Return the storages of the MergedOptions we hold as layers, and those they hold
+
+        Or None if any of our dictionaries hold a MergedOptions, as we don't
+        keep track of those.
+        """
+        if chain is None:
+            chain = [self]
+
+        found = []
+        for layer in self.layers():
+            data = layer[1]
+            if type(data) is MergedOptions:
+                if data.storage in chain:
+                    continue
+                nested = data.storage.nested_storages(chain + [data.storage])
+                if nested is None:
+                    return None
+                found.append(data.storage)
+                found.extend(nested)
+            elif type(data) is LazyData:
+                if data.is_loaded and hp.holds_options(data.data):
+                    return None
+            elif getattr(layer, "holds_options", None) is None or layer.holds_options():
+                return None
+        return found
+
+    def change_key(self):
+        """Return something that is different whenever our layers, or those of our parent, change"""
+        return (self._version, self.parent.change_key() if self.parent is not None else None)
+
+    def as_dict_cache(self):
+        """
+        Return the {key: dictionary} we know for our current version
+
+        Or None if our version says we shouldn't be caching
+        """
+        version = self.version
+        if version == -1:
+            return None
+
+        if getattr(self, "_as_dict_version", None) != version:
+            self._as_dict_cache = {}
+            self._as_dict_version = version
+        return self._as_dict_cache
+
+    def merged_dict(self, path, seen=None, ignore=None):
+        """Merge the layers at this path into a single dictionary"""
         result = {}
         if seen is None:
             seen = {}
@@ -318,45 +1237,87 @@ class Storage(object):
             return {}
         seen[path].append(self)
 
-        for i in range(len(self.data)-1, -1, -1):
-            prefix, data, _ = self.data[i]
+        last = None
+        layers = list(self.layers())
+        for i in range(len(layers)-1, -1, -1):
+            prefix, data, _ = layers[i]
 
-            if prefix:
-                prefixer = list(prefix)
-                while prefixer:
-                    key = prefixer.pop()
-                    data = {key: data}
-
-            val = data
-            used = None
-            found = False
-            path_without_prefix = path
-            while not found or path_without_prefix:
-                if hasattr(data, "is_dict") and data.is_dict:
-                    if hasattr(val, "as_dict"):
-                        val = val.as_dict(path_without_prefix, seen=seen, ignore=ignore)
-                        path_without_prefix = ""
-                    else:
-                        val = dict(val)
-
-                try:
-                    used, val = value_at(val, path_without_prefix, self)
-                    found = True
-                except NotFound:
-                    found = False
-                    break
-
-                if used and path_without_prefix:
-                    path_without_prefix = path_without_prefix.without(dot_joiner(used))
-
-            if found and path_without_prefix == "":
-                is_dict = lambda item: type(item) in (dict, MergedOptions) or isinstance(item, dict)
-                if not is_dict(val):
-                    result = val
-                else:
-                    if not is_dict(result):
-                        result = {}
-                    hp.merge_into_dict(result, val, seen, ignore=ignore)
+            try:
+                val = self.value_in_layer(path, prefix, data, seen=seen, ignore=ignore)
+            except NotFound:
+                continue
+
+            # Merging the same dictionary twice in a row doesn't change anything
+            if val is last and type(val) is dict:
+                continue
+            last = val
+
+            if not hp.is_dict(val):
+                result = val
+            else:
+                if not hp.is_dict(result):
+                    result = {}
+                hp.merge_into_dict(result, val, seen, ignore=ignore)
 
         return result
 
+    def value_in_layer(self, path, prefix, data, seen=None, ignore=None):
+        """
+        Return the value at this path for the data at this prefix
+
+        Raise NotFound if the layer doesn't have anything at this path.
+
+        When the prefix has no dots in its parts and the path is either a string
+        or also has no dots in its parts, we can compare them as strings.
+        Otherwise we find the value in the data
+        wrapped in dictionaries for each part of the prefix.
+        """
+        joined_prefix = dot_joiner(prefix)
+        if joined_prefix:
+            joined = dot_joiner(path)
+            inside_prefix = not joined or joined_prefix.startswith(joined + ".")
+            past_prefix = joined.startswith(joined_prefix + ".")
+            if joined != joined_prefix and not inside_prefix and not past_prefix:
+                raise NotFound
+
+        data = self.loaded(data)
+        if joined_prefix:
+
+            if self.has_simple_parts(prefix) and (getattr(path, "path_is_string", False) or self.has_simple_parts(path)):
+                if joined == joined_prefix:
+                    return data
+                elif inside_prefix:
+                    remainder = joined_prefix[len(joined):].lstrip(".").split(".")
+                    return hp.make_dict(remainder[0], remainder[1:], data)
+                else:
+                    return value_at(data, path.without(joined_prefix), self)[1]
+
+            prefixer = list(prefix)
+            while prefixer:
+                key = prefixer.pop()
+                data = {key: data}
+
+        val = data
+        found = False
+        path_without_prefix = path
+        while not found or path_without_prefix:
+            if hasattr(data, "is_dict") and data.is_dict:
+                if hasattr(val, "as_dict"):
+                    val = val.as_dict(path_without_prefix, seen=seen, ignore=ignore)
+                    path_without_prefix = ""
+                else:
+                    val = dict(val)
+
+            used, val = value_at(val, path_without_prefix, self)
+            found = True
+
+            if used and path_without_prefix:
+                path_without_prefix = path_without_prefix.without(dot_joiner(used))
+
+        return val
+
+    def has_simple_parts(self, path):
+        """Return whether this path is made of strings without dots"""
+        return all(isinstance(part, six.string_types) and "." not in part for part in path)
+
+merge.Storage = Storage
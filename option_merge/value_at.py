@@ -2,11 +2,32 @@ from option_merge.merge import MergedOptions
 from option_merge.not_found import NotFound
 from option_merge.path import Path
 
-def value_at(data, path, called_from=None, chain=None):
+import six
+
+def first_part(path):
+    """
+    Return the first part of this path if it has more than one part
+
+    Or None if the path has one part or isn't a string or list of strings
+    """
+    if path.path_is_string:
+        if "." in path.path:
+            return path.path.split(".", 1)[0]
+    elif path.path_type is list and len(path.path) > 1 and isinstance(path.path[0], six.string_types):
+        return path.path[0]
+
+def value_at(data, path, called_from=None, chain=None, keys_for=None, simple=False):
     """
     Return the value at this path
 
     It is assumed path is a Path object
+
+    If keys_for is given, it is used to get the keys of dictionaries rather
+    than sorting them each time.
+
+    If simple is True then we know the dictionaries don't have keys with dots
+    in them or keys that aren't strings, so we can look up each part of the
+    path directly.
     """
     if not chain:
         chain = []
@@ -21,11 +42,33 @@ def value_at(data, path, called_from=None, chain=None):
     joined = path.joined()
     isMergedOptions = data_type is MergedOptions
 
+    if simple and data_type is dict:
+        if joined in data:
+            if not chain:
+                return path, data[joined]
+            else:
+                return chain + [path], data[joined]
+
+        key = first_part(path)
+        if key is None or key not in data:
+            if key is not None or path.path_is_string or len(path) <= 1:
+                raise NotFound
+        else:
+            nxt = data[key]
+            storage = getattr(nxt, "storage", None)
+            if storage and called_from is storage:
+                raise NotFound
+
+            prefix = Path.convert(path.without(key)).ignoring_converters(path.ignore_converters)
+            return value_at(nxt, prefix, called_from, chain=chain+[key], keys_for=keys_for, simple=True)
+
     if not data:
         keys = []
     else:
         if hasattr(data, "reversed_keys"):
             keys = list(data.reversed_keys())
+        elif keys_for is not None and data_type is dict:
+            keys = keys_for(data)
         else:
             keys = list(reversed(sorted(data.keys(), key=lambda d: len(str(d)))))
 
@@ -57,7 +100,9 @@ def value_at(data, path, called_from=None, chain=None):
                     return chain+[key], nxt
 
                 prefix = Path.convert(prefix).ignoring_converters(path.ignore_converters)
-                return value_at(nxt, prefix, called_from, chain=chain+[key])
+                if isMergedOptions:
+                    return value_at(nxt, prefix, called_from, chain=chain+[key])
+                return value_at(nxt, prefix, called_from, chain=chain+[key], keys_for=keys_for, simple=simple)
             except NotFound:
                 pass
 
@@ -1,6 +1,18 @@
 import random
 import time
 
+def cache_sizes(instance):
+    """
+    Return {attribute: number of cached values} for the versioned caches on this instance
+
+    These are the ``_<name>_cached`` and ``_<name>_value_cache`` attributes.
+    """
+    sizes = {}
+    for key, val in vars(instance).items():
+        if key.startswith("_") and (key.endswith("_cached") or key.endswith("_value_cache")) and isinstance(val, dict):
+            sizes[key] = sum(len(by_ignore) for by_ignore in val.values())
+    return sizes
+
 class versioned_value(object):
     """
     A property that holds a cache of {prefix: {ignore_converters: value}}
@@ -1,6 +1,7 @@
 # coding: spec
 
 from option_merge.collector import Collector
+from option_merge.sections import json_sections
 from option_merge import MergedOptions
 
 from delfick_error import DelfickErrorTestMixin, DelfickError
@@ -308,6 +309,109 @@ describe TestCase, "Collector":
                       ]
                     )
 
+        it "reads includes ahead of time but adds them in the same order":
+            called = []
+            args_dict = mock.Mock(name="args_dict")
+            configuration = MergedOptions.using({})
+
+            with self.fake_config() as (config_root, config_file):
+                locs = {}
+                for name in ("one", "two", "three"):
+                    locs[name] = os.path.join(config_root, "{0}.json".format(name))
+                    with open(locs[name], "w") as fle: fle.write("{}")
+
+                results = {config_file: {"extra": [locs["one"], locs["two"]]}, locs["one"]: {"extra": [locs["three"]]}, locs["two"]: {"extra": [locs["three"]]}, locs["three"]: {"extra": []}}
+
+                class Col(Collector):
+                    read_workers = 3
+
+                    def start_configuration(slf):
+                        return configuration
+
+                    def read_file(slf, location):
+                        return results[location]
+
+                    def includes_for(slf, result, src):
+                        return result["extra"]
+
+                    def add_configuration(slf, config, collect_another_source, done, result, src):
+                        for loc in result["extra"]:
+                            collect_another_source(loc)
+                        called.append(src)
+
+                collector = Col()
+                with mock.patch.object(Col, "read_location", side_effect=Col.read_location, autospec=True) as read_location:
+                    collector.collect_configuration(config_file, args_dict)
+
+                self.assertEqual(called, [locs["three"], locs["one"], locs["two"], config_file])
+                self.assertEqual(collector.configuration_files, [config_file, locs["one"], locs["three"], locs["two"]])
+                self.assertEqual(sorted(call[0][1] for call in read_location.call_args_list), sorted([config_file, locs["one"], locs["two"], locs["three"]]))
+
+        it "complains about includes that aren't locations rather than waiting forever":
+            with self.fake_config() as (config_root, config_file):
+                class Col(Collector):
+                    read_workers = 2
+                    def start_configuration(slf): return MergedOptions()
+                    def read_file(slf, location): return {"a": 1}
+                    def includes_for(slf, result, src): return [("other.yml", ["prefix"])]
+                    def add_configuration(slf, config, collect_another_source, done, result, src):
+                        config.update(result, source=src)
+
+                with self.fuzzyAssertRaisesError(TypeError):
+                    Col().collect_configuration(config_file, {})
+
+        it "logs circular includes":
+            with self.fake_config() as (config_root, config_file):
+                other_loc = os.path.join(config_root, 'other.json')
+                with open(other_loc, "w") as fle:
+                    fle.write("{}")
+                results = {config_file: {"extra": other_loc}, other_loc: {"extra": config_file}}
+
+                class Col(Collector):
+                    def start_configuration(slf): return MergedOptions()
+                    def read_file(slf, location): return results[location]
+                    def add_configuration(slf, config, collect_another_source, done, result, src):
+                        collect_another_source(result["extra"])
+
+                with mock.patch("option_merge.collector.log") as log:
+                    Col().collect_configuration(config_file, {})
+                log.warning.assert_called_once_with("Ignoring circular include of configuration\tchain=%s", " -> ".join([config_file, other_loc, config_file]))
+
+        it "can read files as sections":
+            with self.fake_config('{"a": {"b": 1}, "c": {"d": 2}}') as (config_root, config_file):
+                class Col(Collector):
+                    def start_configuration(slf): return MergedOptions()
+                    def read_file(slf, location): raise AssertionError("Shouldn't read the whole file")
+                    def read_sections(slf, location): return json_sections(location)
+                    def add_configuration(slf, config, collect_another_source, done, result, src):
+                        config.update(result, source=src)
+
+                collector = Col()
+                collector.prepare(config_file, {})
+                self.assertEqual(collector.configuration["a.b"], 1)
+                self.assertEqual(collector.configuration.source_for("c.d"), [config_file])
+                self.assertEqual(collector.configuration["config_root"], config_root)
+
+        it "can write a snapshot of the configuration":
+            with self.fake_config('{"a": {"b": 1}}') as (config_root, config_file):
+                class Col(Collector):
+                    def start_configuration(slf): return MergedOptions()
+                    def read_file(slf, location): return json.load(open(location))
+                    def add_configuration(slf, config, collect_another_source, done, result, src):
+                        config.update(result, source=src)
+
+                collector = Col()
+                collector.prepare(config_file, {})
+                self.assertEqual(collector.configuration_files, [os.path.abspath(config_file)])
+
+                location = os.path.join(config_root, "snapshot")
+                collector.write_snapshot(location)
+
+                from option_merge.snapshot import Snapshot
+                snapshot = Snapshot.load(location)
+                self.assertEqual(snapshot.as_dict(), {"a": {"b": 1}, "config_root": config_root})
+                self.assertEqual(snapshot.source_for("a.b"), [config_file])
+
         it "collects errors from reading files and raises a mother exception":
             class BadJson(DelfickError): pass
             class BadConfiguration(DelfickError): pass
@@ -6,6 +6,7 @@ from option_merge.path import Path
 from noseOfYeti.tokeniser.support import noy_sup_setUp
 from delfick_error import DelfickErrorTestMixin
 import unittest
+import pickle
 import mock
 
 class TestCase(unittest.TestCase, DelfickErrorTestMixin): pass
@@ -104,6 +105,16 @@ describe TestCase, "Converters":
 			converters.append(converter2)
 			self.assertEqual(converters._converters, [converter1, converter2])
 
+		it "knows if it is empty regardless of activation":
+			converters = Converters()
+			assert converters.empty()
+
+			converters.append(mock.Mock(name="converter"))
+			assert not converters.empty()
+
+			converters.activate()
+			assert not converters.empty()
+
 	describe "Activation":
 		it "just sets activated to True":
 			converters = Converters()
@@ -154,3 +165,17 @@ describe TestCase, "Converters":
 			self.assertIs(converters.converted_val(Path("1.2.3")), val)
 			self.assertIs(converters.converted_val("1.2.3"), val)
 
+	describe "Pickling":
+		it "only keeps the converted values":
+			converters = Converters()
+			converters.append(Converter(convert=lambda p, v: v, convert_path=["a"]))
+			converters.activate()
+			converters.started(Path("b"))
+			converters.done(Path("a"), 1)
+
+			restored = pickle.loads(pickle.dumps(converters))
+			assert restored.empty()
+			assert restored.activated
+			assert restored.converted(Path("a"))
+			assert not restored.waiting(Path("b"))
+			self.assertEqual(restored.converted_val(Path("a")), 1)
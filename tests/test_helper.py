@@ -135,3 +135,117 @@ describe TestCase, "merge_into_dict":
             hp.merge_into_dict(target, source)
             self.assertEqual(target, {"and": "fifteen", "a":1, "cap":{"one": "ONE"}, "three": {"four": "FOUR"}, "one": 1, "two": 2})
 
+
+describe TestCase, "combined_dicts":
+    it "deeply merges the dictionaries with later ones taking precedence":
+        one = {"a": 1, "b": {"c": 2, "d": {"e": 3}}, "f": {"g": 4}}
+        two = {"a": 5, "b": {"d": {"i": 6}}, "f": {"g": 7}}
+        three = {"b": {"c": 8}}
+        self.assertEqual(hp.combined_dicts([one, two, three])
+            , {"a": 5, "b": {"c": 8, "d": {"e": 3, "i": 6}}, "f": {"g": 7}}
+            )
+
+    it "doesn't change the dictionaries it is given":
+        one = {"a": {"b": 1}}
+        two = {"a": {"c": 2}}
+        combined = hp.combined_dicts([one, two])
+        self.assertEqual(combined, {"a": {"b": 1, "c": 2}})
+        self.assertEqual(one, {"a": {"b": 1}})
+        self.assertEqual(two, {"a": {"c": 2}})
+        self.assertIsNot(combined["a"], one["a"])
+
+    it "returns None if there are dotted keys or dictionary like objects":
+        self.assertIs(hp.combined_dicts([{"a": 1}, {"b": {"c.d": 2}}]), None)
+        self.assertIs(hp.combined_dicts([{"a": 1}, {"b": MergedOptions.using({"c": 2})}]), None)
+
+    it "returns None if a dictionary replaces something that isn't a dictionary or the other way round":
+        self.assertIs(hp.combined_dicts([{"a": {"b": 1}}, {"a": 2}]), None)
+        self.assertIs(hp.combined_dicts([{"a": {"b": {"c": 1}}}, {"a": {"b": 2}}]), None)
+        self.assertIs(hp.combined_dicts([{"a": 1}, {"a": {"b": 2}}]), None)
+
+describe TestCase, "combine_into":
+    it "leaves the result alone if the data can't be combined with it":
+        result = {"a": {"b": 1}}
+        self.assertIs(hp.combine_into(result, {"c": 2, "a": 3}), False)
+        self.assertEqual(result, {"a": {"b": 1}})
+
+        self.assertIs(hp.combine_into(result, {"c": 2, "a": {"d": 3}}), True)
+        self.assertEqual(result, {"a": {"b": 1, "d": 3}, "c": 2})
+
+describe TestCase, "copy_dicts":
+    it "copies the dictionaries but not the other values":
+        val = [1, 2]
+        data = {"a": {"b": val, "c": {"d": 1}}, "e": 2}
+        copied = hp.copy_dicts(data)
+        self.assertEqual(copied, data)
+        self.assertIsNot(copied["a"], data["a"])
+        self.assertIsNot(copied["a"]["c"], data["a"]["c"])
+        self.assertIs(copied["a"]["b"], val)
+
+    it "returns other values as they are":
+        val = [1, 2]
+        self.assertIs(hp.copy_dicts(val), val)
+
+describe TestCase, "has_simple_keys":
+    it "says whether all the keys are strings without dots":
+        self.assertIs(hp.has_simple_keys({"a": {"b": {"c": 1}}, "d": [{"e.f": 2}]}), True)
+        self.assertIs(hp.has_simple_keys({"a": {"b": {"c.d": 1}}}), False)
+        self.assertIs(hp.has_simple_keys({"a": {1: 2}}), False)
+        self.assertIs(hp.has_simple_keys({"a": MergedOptions.using({"b.c": 1})}), True)
+
+    it "says False for anything that isn't a dictionary":
+        for data in (None, 1, [], MergedOptions.using({"a": 1})):
+            self.assertIs(hp.has_simple_keys(data), False)
+
+describe TestCase, "interned":
+    it "shares identical dictionaries and lists":
+        table = {}
+        env = {"HOME": "/home", "PATHS": ["/bin", "/usr/bin"]}
+        first = hp.interned({"one": {"env": env}, "two": {"env": dict(env, PATHS=list(env["PATHS"]))}}, table)
+        self.assertEqual(first, {"one": {"env": env}, "two": {"env": env}})
+        self.assertIs(first["one"]["env"], first["two"]["env"])
+
+        second = hp.interned({"three": {"env": {"HOME": "/home", "PATHS": ["/bin", "/usr/bin"]}}, "four": {"env": env}}, table)
+        self.assertIs(second["three"]["env"], first["one"]["env"])
+        self.assertIs(second["four"], first["one"])
+
+    it "doesn't share values that are only equal":
+        table = {}
+        result = hp.interned({"a": {"b": 1}, "c": {"b": True}, "d": {"b": 1.0}}, table)
+        self.assertIsNot(result["a"], result["c"])
+        self.assertIsNot(result["a"], result["d"])
+
+        thing = mock.Mock(name="thing")
+        result = hp.interned([{"e": thing}, {"e": thing}, {"e": mock.Mock(name="other")}, {"e": [set()]}], table)
+        self.assertIs(result[0], result[1])
+        self.assertIsNot(result[0], result[2])
+
+    it "doesn't share dictionaries whose keys are only equal":
+        table = {}
+        first = hp.interned({"x": {1: "on"}}, table)
+        second = hp.interned({"y": {True: "on"}}, table)
+        self.assertIsNot(second["y"], first["x"])
+        self.assertEqual([type(key) for key in second["y"]], [bool])
+
+    it "doesn't change the data it's given":
+        data = {"a": {"b": [1, 2]}, "c": {"b": [1, 2]}}
+        inner = data["c"]
+        result = hp.interned(data, {})
+        self.assertIs(data["c"], inner)
+        self.assertIs(result["a"], result["c"])
+        self.assertIsNot(result, data)
+
+    it "keeps anything that isn't a dictionary or list as is":
+        options = MergedOptions.using({"a": 1})
+        for data in (None, 1, "a", options):
+            self.assertIs(hp.interned(data, {}), data)
+
+        result = hp.interned({"a": options, "b": options}, {})
+        self.assertIs(result["a"], options)
+
+    it "copes with data that contains itself":
+        data = {"a": {"b": 1}}
+        data["c"] = data
+        result = hp.interned(data, {})
+        self.assertEqual(result["a"], {"b": 1})
+        self.assertIs(result["c"], data)
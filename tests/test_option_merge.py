@@ -11,6 +11,7 @@ from option_merge.storage import Storage
 from noseOfYeti.tokeniser.support import noy_sup_setUp
 from delfick_error import DelfickErrorTestMixin
 import unittest
+import pickle
 import mock
 
 class TestCase(unittest.TestCase, DelfickErrorTestMixin): pass
@@ -107,6 +108,155 @@ describe TestCase, "MergedOptions":
             self.assertEqual(options2.source_for("thing.other"), ["e"])
             self.assertEqual(options3.source_for("place.other"), ["e"])
 
+    describe "source_map":
+        it "returns the sources for every path":
+            options = MergedOptions()
+            options.update({"wat": 1}, source="a")
+            options.update({"yeap": {"blah": 3, "meh": 4}}, source="b")
+            options.update({"yeap": {"blah": 2}}, source="d")
+
+            options2 = MergedOptions()
+            options2.update({"thing": {"other": 10}}, source="e")
+
+            options3 = MergedOptions.using(options)
+            options3["place"] = options2["thing"]
+
+            self.assertEqual(options3.source_map()
+                , { "wat": ["a"], "yeap": ["d", "b"], "yeap.blah": ["d", "b"], "yeap.meh": ["b"]
+                  , "place": ["e"], "place.other": ["e"]
+                  }
+                )
+            self.assertEqual(options3["yeap"].source_map(), {"blah": ["d", "b"], "meh": ["b"]})
+
+            for path, sources in options3.source_map().items():
+                self.assertEqual(options3.source_for(path), sources)
+
+    describe "wrapped":
+        it "sees the data from the original":
+            options = MergedOptions.using({"a": {"b": 1}, "c": 2}, source="one")
+            wrapped = options.wrapped()
+            self.assertEqual(wrapped["a.b"], 1)
+            self.assertEqual(sorted(wrapped.keys()), ["a", "c"])
+            self.assertEqual(wrapped.source_for("a.b"), ["one"])
+
+            options.update({"a": {"b": 3}}, source="two")
+            self.assertEqual(wrapped["a.b"], 3)
+            self.assertEqual(wrapped.source_for("a.b"), ["two", "one"])
+
+        it "has no keys when there are no layers anywhere":
+            wrapped = MergedOptions().wrapped()
+            self.assertEqual(list(wrapped.keys()), [])
+            self.assertEqual(len(wrapped), 0)
+            self.assertEqual(list(wrapped), [])
+
+            twice = wrapped.wrapped()
+            self.assertEqual(list(twice.keys()), [])
+            self.assertEqual(len(twice), 0)
+            self.assertEqual(list(twice), [])
+
+        it "doesn't change the original when it is changed":
+            options = MergedOptions.using({"a": {"b": 1}}, {"c": 2})
+            wrapped = options.wrapped()
+            wrapped.update({"a": {"b": 5}})
+            wrapped["d"] = 6
+
+            self.assertEqual(wrapped.as_dict(), {"a": {"b": 5}, "c": 2, "d": 6})
+            self.assertEqual(options.as_dict(), {"a": {"b": 1}, "c": 2})
+
+        it "looks at the layers of the original directly":
+            options = MergedOptions.using({"a": 1}, {"b": 2})
+            wrapped = options.wrapped()
+            self.assertEqual(wrapped.storage.data, [])
+            self.assertIs(wrapped.storage.parent, options.storage)
+            self.assertIs(wrapped.converters, options.converters)
+
+        it "wraps a prefixed MergedOptions":
+            options = MergedOptions.using({"a": {"b": 1}})
+            wrapped = options["a"].wrapped()
+            self.assertEqual(wrapped.as_dict(), {"b": 1})
+            self.assertEqual(wrapped.storage.data, [([], options["a"], None)])
+
+    describe "Pickling":
+        it "keeps the data and converted values":
+            options = MergedOptions.using({"a": {"b": 1}}, {"a": {"c": 2}}, source="one")
+            options.add_converter(Converter(convert=lambda p, v: v + 1, convert_path=["a", "b"]))
+            options.converters.activate()
+            self.assertEqual(options["a.b"], 2)
+
+            restored = pickle.loads(pickle.dumps(options))
+            self.assertEqual(restored["a.b"], 2)
+            self.assertEqual(restored["a"]["c"], 2)
+            self.assertEqual(restored.source_for("a.c"), ["one"])
+            self.assertEqual(restored.as_dict(), {"a": {"b": 1, "c": 2}})
+            assert restored.converters.empty()
+
+        it "keeps the prefix and shares storage between MergedOptions":
+            options = MergedOptions.using({"a": {"b": 1}})
+            restored_a, restored = pickle.loads(pickle.dumps((options["a"], options)))
+            self.assertEqual(restored_a.prefix_string, "a")
+            self.assertIs(restored_a.storage, restored.storage)
+            self.assertEqual(restored_a.as_dict(), {"b": 1})
+            self.assertEqual(dict.items(restored), dict.items({}))
+
+    describe "Frozen options":
+        it "adds frozen layers to the storage":
+            options = MergedOptions.using({"a": {"b": 1}}, source="one", frozen=True)
+            options.update({"a": {"c": 2}})
+            self.assertEqual([layer.frozen for layer in options.storage.data], [False, True])
+            self.assertEqual(options["a.b"], 1)
+            self.assertEqual(options["a"].as_dict(), {"b": 1, "c": 2})
+
+        it "can dedupe identical parts of frozen layers":
+            defaults = {"env": {"HOME": "/home"}}
+            options = MergedOptions.using({"tasks": {"one": {"env": {"HOME": "/home"}}}}, source="one", dedupe=True)
+            options.update({"tasks": {"two": dict(defaults)}}, dedupe=True)
+            options.update({"tasks": {"three": {"env": {"HOME": "/root"}}}})
+
+            self.assertEqual([layer.frozen for layer in options.storage.data], [False, True, True])
+            self.assertIs(options.storage.data[1][1]["tasks"]["two"]["env"], options.storage.data[2][1]["tasks"]["one"]["env"])
+            self.assertEqual(options.as_dict(), {"tasks": {"one": defaults, "two": defaults, "three": {"env": {"HOME": "/root"}}}})
+
+        it "keeps keys that are only equal when deduping":
+            options = MergedOptions.using({"x": {1: "on"}}, dedupe=True)
+            options.update({"y": {True: "on"}}, dedupe=True)
+            self.assertEqual([type(key) for key in options.storage.data[0][1]["y"]], [bool])
+
+    describe "Coalescing options":
+        it "adds runs of dictionaries as one layer":
+            options = MergedOptions.using({"a": 1, "b": {"c": 2}}, {"b": {"d": 3}}, {"e": 4}, source="one", coalesce=True)
+            self.assertEqual(options.storage.data, [([], {"a": 1, "b": {"c": 2, "d": 3}, "e": 4}, "one")])
+            self.assertEqual(options["b.c"], 2)
+            self.assertEqual(options.source_for("b.d"), ["one"])
+
+        it "finds the same values as using separate layers":
+            dicts = [{"a": {"b": 1, "c": {"d": 2}}}, {"a": {"c": {"d": 3}}, "e": {"f": 4}}, {"a": {"g": 5}, "e": {"f": 6}}]
+            separate = MergedOptions.using(*dicts, source="one")
+            coalesced = MergedOptions.using(*dicts, source="one", coalesce=True)
+            self.assertEqual(len(coalesced.storage.data), 1)
+            self.assertEqual(coalesced.as_dict(), separate.as_dict())
+            for path, sources in coalesced.source_map().items():
+                self.assertEqual(separate.source_for(path), sources)
+            self.assertEqual(dicts[0], {"a": {"b": 1, "c": {"d": 2}}})
+
+        it "doesn't merge past a dictionary that replaces a dictionary with something else":
+            dicts = [{"c": {"b": 7}}, {"c": 8}, {"c": {}}]
+            separate = MergedOptions.using(*dicts, source="one")
+            coalesced = MergedOptions.using(*dicts, source="one", coalesce=True)
+            self.assertEqual(separate.get("c.b"), 7)
+            self.assertEqual(coalesced.get("c.b"), 7)
+            self.assertEqual(coalesced.as_dict(), separate.as_dict())
+            self.assertEqual(coalesced.storage.data, [([], {"c": {}}, "one"), ([], {"c": 8}, "one"), ([], {"c": {"b": 7}}, "one")])
+
+            options = MergedOptions.using({"a": 1}, {"b": {"c": 2}}, {"b": 3}, {"d": 4}, coalesce=True)
+            self.assertEqual(options.storage.data, [([], {"b": 3, "d": 4}, None), ([], {"a": 1, "b": {"c": 2}}, None)])
+
+        it "keeps anything else as separate layers":
+            nested = MergedOptions.using({"d": 4})
+            options = MergedOptions.using({"a": 1}, {"b": 2}, nested, None, {"c.d": 3}, {"e": 5}, coalesce=True)
+            self.assertEqual(options.storage.data
+                , [([], {"e": 5}, None), ([], {"c.d": 3}, None), ([], nested, None), ([], {"a": 1, "b": 2}, None)]
+                )
+
     describe "Adding more options":
 
         it "has method for adding more options":
@@ -286,6 +436,48 @@ describe TestCase, "MergedOptions":
             final.converters.activate()
             self.assertIs(final["images.thing"], converted_val)
 
+    describe "prefixed":
+        it "returns the same MergedOptions for the same path":
+            options = MergedOptions.using({"a": {"b": {"c": 1}}})
+            self.assertIs(options["a"], options["a"])
+            self.assertIs(options["a"]["b"], options["a.b"])
+            self.assertIs(options.prefixed("a"), options["a"])
+            self.assertIsNot(options.prefixed("a", ignore_converters=True), options["a"])
+
+            options["a"].update({"b": {"c": 2}})
+            self.assertEqual(options["a"]["b"]["c"], 2)
+
+        it "doesn't share between different converters or dont_prefix":
+            options = MergedOptions.using({"a": {"b": 1}})
+            other = MergedOptions(storage=options.storage)
+            different = MergedOptions(storage=options.storage, dont_prefix=[int], converters=other.converters)
+            self.assertIsNot(other["a"], options["a"])
+            self.assertIsNot(different["a"], other["a"])
+            self.assertEqual(other["a"], options["a"])
+
+    describe "Getting many items":
+        it "gets the same values as get":
+            options = MergedOptions.using({"a": 1, "b": {"c": 2}, "d.e": 3}, {"b": {"f": 4}})
+            options[["g", "h"]] = 5
+            paths = ["a", "b.c", "b.f", "b", "d.e", "g", "g.h", ["b", "c"], "z", "b.z"]
+            self.assertEqual(options.get_many(paths, default=6), [options.get(path, 6) for path in paths])
+            self.assertEqual(options["b"].get_many(["c", "f", "z"]), [2, 4, None])
+
+        it "uses converters":
+            options = MergedOptions.using({"a": 1, "b": 2})
+            options.add_converter(Converter(convert=lambda p, v: v + 1, convert_path=["a"]))
+            options.converters.activate()
+            self.assertEqual(options.get_many(["a", "b"]), [2, 2])
+            self.assertEqual(options.get_many(["a", "b"], ignore_converters=True), [1, 2])
+
+        it "respects dont_prefix":
+            class A(dict): pass
+            a = A()
+            options = MergedOptions.using({"a": a, "b": {}}, dont_prefix=[A])
+            one, two = options.get_many(["a", "b"])
+            self.assertIs(one, a)
+            self.assertEqual(type(two), MergedOptions)
+
     describe "Setting an item":
         it "adds to data":
             self.merged["a"] = 1
@@ -345,6 +537,31 @@ describe TestCase, "MergedOptions":
             values = list(self.merged.values_for('b'))
             self.assertEqual(values, [({'d':8}, False), ({}, False)])
 
+        it "doesn't change the dictionaries it was given":
+            first = {'a': 1, 'b': {'c': 5, 'd': 6}}
+            second = {'b': {'c': 7}}
+            self.merged.update(first)
+            self.merged.update(second)
+
+            del self.merged['b.c']
+            del self.merged['b.c']
+            del self.merged['a']
+            self.assertEqual(self.merged.as_dict(), {'b': {'d': 6}})
+            self.assertEqual(first, {'a': 1, 'b': {'c': 5, 'd': 6}})
+            self.assertEqual(second, {'b': {'c': 7}})
+
+        it "can delete many keys at once":
+            self.merged.update({'a':1, 'b':{'c':5}})
+            self.merged.update({'a':2, 'b':{'c':6, 'd':8}})
+            self.merged['b'] = {'e': 9}
+
+            self.merged.delete_many(['a', 'b.c', 'b', 'a'])
+            self.assertEqual(self.merged.as_dict(), {'b': {'c': 5, 'd': 8}})
+
+            with self.fuzzyAssertRaisesError(KeyError, "a"):
+                self.merged.delete_many(['b.d', 'a'])
+            self.assertEqual(self.merged.as_dict(), {'b': {'c': 5}})
+
         it "can delete dot seperated values":
             self.merged.update({'a':1, 'b':{'c':5}})
             self.merged.update({'a':{'c':4}, 'b':{'c':6, 'd':8}})
@@ -469,6 +686,25 @@ describe TestCase, "MergedOptions":
             opts = MergedOptions.using({"items": MergedOptions()})
             self.assertEqual(list(opts["items"].items()), [])
 
+    describe "memory_report":
+        it "reports the storage, caches, converters and paths":
+            self.merged.update({"a": {"b": 1, "c": 2}}, source="one")
+            self.merged.update({"a": {"b": 3}}, source="two")
+            self.merged.add_converter(Converter(convert=lambda p, v: v, convert_path=["a", "b"]))
+            self.merged.converters.activate()
+
+            a = self.merged["a"]
+            self.assertEqual(a["b"], 3)
+            self.assertEqual(a["c"], 2)
+
+            report = self.merged.memory_report()
+            self.assertEqual([(layer["source"], layer["keys"]) for layer in report["storage"]["layers"]], [("two", 1), ("one", 2)])
+            self.assertEqual(report["storage"]["duplicates"], {"a.b": 2})
+            self.assertEqual(report["storage"]["views"], 1)
+            assert report["caches"]["___getitem___cached"] > 0
+            self.assertEqual(report["converters"], {"converters": 1, "converted": 1, "waiting": 0})
+            assert report["paths"] > 0
+
 describe TestCase, "Converters":
     it "has a KeyValuePairs converter on MergedOptions":
         result = MergedOptions.KeyValuePairs([(["one"], "two"), (["three", "four"], "five")])
@@ -610,3 +846,16 @@ describe TestCase, "Converters":
             self.assertEqual(list(converted["cats"].keys()), ["pandas"])
             self.assertEqual(dict(converted["cats"]["pandas"].items()), {"one": "two", "hi": "hello", "__class__": Obj})
 
+
+describe TestCase, "option_merge package":
+    it "has the public names":
+        import option_merge
+        self.assertIs(option_merge.MergedOptions, MergedOptions)
+        self.assertIs(option_merge.Converter, Converter)
+        self.assertIs(option_merge.NotFound, NotFound)
+        for name in option_merge.__all__:
+            assert name in dir(option_merge)
+            getattr(option_merge, name)
+
+        with self.fuzzyAssertRaisesError(AttributeError):
+            option_merge.nope
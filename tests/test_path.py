@@ -8,6 +8,7 @@ from option_merge.path import Path
 from noseOfYeti.tokeniser.support import noy_sup_setUp
 from delfick_error import DelfickErrorTestMixin
 import unittest
+import pickle
 import mock
 
 class TestCase(unittest.TestCase, DelfickErrorTestMixin): pass
@@ -108,6 +109,24 @@ describe TestCase, "Path":
 			self.assertEqual(hash(Path(["1", "2", "3"])), hash("1.2.3"))
 			self.assertEqual(hash(Path("1.2.3")), hash("1.2.3"))
 
+		it "remembers the hash and compares other paths by their joined form":
+			path = Path(["a.b", "c"])
+			other = Path(["a", "b", "c"])
+			empty = Path([])
+			self.assertEqual(hash(path), hash("a.b.c"))
+			self.assertEqual(other.joined(), "a.b.c")
+			self.assertEqual(empty.joined(), "")
+
+			with mock.patch("option_merge.path.dot_joiner", mock.Mock(name="dot_joiner", side_effect=Exception("Shouldn't join"))):
+				self.assertEqual(hash(path), hash("a.b.c"))
+				self.assertEqual(path, Path("a.b.c"))
+				self.assertEqual(other, path)
+				self.assertNotEqual(path, Path("a.b"))
+				self.assertEqual(empty, Path(""))
+
+			paths = {Path("a.b.c"): 1}
+			self.assertEqual(paths[Path(["a", "b.c"])], 1)
+
 	describe "without":
 		it "uses string_slicing if path is a string":
 			self.assertEqual(Path("1.2.3").without("1.2"), Path("3"))
@@ -134,6 +153,14 @@ describe TestCase, "Path":
 			self.assertEqual(Path(["a", "b"]).without([]), Path("a.b"))
 			self.assertEqual(Path(["a", "b"]).without(Path("")), Path("a.b"))
 
+		it "keeps the parts after the base in list paths":
+			path = Path(["a", "b", "c"]).without("a.b")
+			self.assertEqual(path.path, ["c"])
+			self.assertEqual(path.joined(), "c")
+
+			self.assertEqual(Path(["a", "b.c", "d"]).without("a").path, ["b.c", "d"])
+			self.assertEqual(Path(["a", "bc", "d"]).without("a.b"), Path("c.d"))
+
 	describe "Prefixed":
 		it "returns a clone with the prefix joined to the path":
 			path = mock.Mock(name="path")
@@ -349,3 +376,14 @@ describe TestCase, "Path":
 			path = Path(p1, converters=converters)
 			self.assertIs(path.converted_val(), result)
 
+	describe "Pickling":
+		it "only keeps the path and ignore_converters":
+			path = Path(["a", "b"], configuration=object(), converters=Converters(), ignore_converters=True)
+			path = path.using(["a", "b", "c"], ignore_converters=True)
+			restored = pickle.loads(pickle.dumps(path))
+
+			self.assertEqual(restored, "a.b.c")
+			self.assertEqual(restored.path, ["a", "b", "c"])
+			self.assertEqual(restored.ignore_converters, True)
+			self.assertIs(restored.configuration, None)
+			self.assertIs(restored.converters, None)
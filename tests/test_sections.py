@@ -0,0 +1,85 @@
+# coding: spec
+
+from option_merge.sections import json_sections, json_spans, sectioned_options
+from option_merge import MergedOptions
+
+from delfick_error import DelfickErrorTestMixin
+import tempfile
+import unittest
+import shutil
+import pickle
+import json
+import os
+
+class TestCase(unittest.TestCase, DelfickErrorTestMixin): pass
+
+describe TestCase, "sections":
+    before_each:
+        self.root = tempfile.mkdtemp()
+        self.location = os.path.join(self.root, "config.json")
+
+    after_each:
+        shutil.rmtree(self.root)
+
+    def write(self, body):
+        with open(self.location, "w") as fle:
+            fle.write(body)
+
+    it "finds each top level value":
+        body = ' { "a" : {"b": [1, {"c": "}]"}]}, "d\\"e": "f\\\\", "g": 1.5 , "h": [] ,"i":true, "j": null}\n'
+        self.assertEqual([(key, body[start:end]) for key, start, end in json_spans(body.encode("utf-8"))]
+            , [ ("a", '{"b": [1, {"c": "}]"}]}')
+              , ('d"e', '"f\\\\"')
+              , ("g", "1.5 ")
+              , ("h", "[]")
+              , ("i", "true")
+              , ("j", "null")
+              ]
+            )
+
+    it "knows about empty objects":
+        self.assertEqual(list(json_spans(b" {\n } ")), [])
+
+    it "complains about documents that aren't objects":
+        with self.fuzzyAssertRaisesError(ValueError):
+            list(json_spans(b"[1, 2]"))
+        with self.fuzzyAssertRaisesError(ValueError):
+            list(json_spans(b'{"a": [1, 2}'))
+        with self.fuzzyAssertRaisesError(ValueError):
+            list(json_spans(b'{"a": "b'))
+
+    it "gives loaders that only parse their section":
+        data = {"a": {"b": [1, 2]}, u"☃": "snow", "c": 3}
+        self.write(json.dumps(data))
+        sections = dict(json_sections(self.location))
+        self.assertEqual(sorted(sections), sorted(data))
+        for key, loader in sections.items():
+            self.assertEqual(loader(), data[key])
+
+    it "makes a MergedOptions that loads each section when we look inside it":
+        loaded = []
+        def loader(key, val):
+            def load():
+                loaded.append(key)
+                return val
+            return load
+        options = sectioned_options([("a", loader("a", {"b": 1})), ("c", loader("c", 2))], source="config.json")
+
+        self.assertEqual(sorted(options.keys()), ["a", "c"])
+        self.assertEqual(loaded, [])
+
+        self.assertEqual(options["a.b"], 1)
+        self.assertEqual(options.source_for("a.b"), ["config.json"])
+        self.assertEqual(loaded, ["a"])
+
+        configuration = MergedOptions.using(options)
+        self.assertEqual(configuration.as_dict(), {"a": {"b": 1}, "c": 2})
+        self.assertEqual(loaded, ["a", "c"])
+
+    it "makes options that can be pickled":
+        self.write(json.dumps({"a": {"b": 1}, "c": 2}))
+        options = sectioned_options(json_sections(self.location), source=self.location)
+
+        restored = pickle.loads(pickle.dumps(options))
+        self.assertEqual(restored.as_dict(), {"a": {"b": 1}, "c": 2})
+        self.assertEqual(restored.source_for("a.b"), [self.location])
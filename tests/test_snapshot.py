@@ -0,0 +1,149 @@
+# coding: spec
+
+from option_merge.snapshot import Snapshot, SharedSnapshot, BadSnapshot, dump, dumps, fingerprint, shared_memory
+from option_merge import MergedOptions
+
+from delfick_error import DelfickErrorTestMixin
+import tempfile
+import unittest
+import shutil
+import pickle
+import time
+import os
+
+class TestCase(unittest.TestCase, DelfickErrorTestMixin): pass
+
+describe TestCase, "Snapshot":
+    before_each:
+        self.options = MergedOptions.using({"a": {"b": 1, "c": [1, 2], "d": {}}, "e": "f", "a-g": 2}, source="one")
+        self.options.update({"a": {"b": 3}, "h.i": {"j": None}}, source="two")
+
+    it "can get values and prefixed snapshots":
+        snapshot = Snapshot(dumps(self.options))
+        self.assertEqual(snapshot["a.b"], 3)
+        self.assertEqual(snapshot["a"]["c"], [1, 2])
+        self.assertEqual(snapshot[["a", "d"]], {})
+        self.assertEqual(snapshot["h.i"]["j"], None)
+        self.assertEqual(snapshot["h.i.j"], None)
+        self.assertEqual(type(snapshot["a"]), Snapshot)
+
+        with self.fuzzyAssertRaisesError(KeyError, "a.z"):
+            snapshot["a.z"]
+
+        assert "e" in snapshot
+        assert "a.z" not in snapshot
+        self.assertEqual(snapshot.get("a.z", 4), 4)
+
+    it "knows the keys under a prefix":
+        snapshot = Snapshot(dumps(self.options))
+        self.assertEqual(sorted(snapshot.keys()), sorted(["a", "a-g", "e", "h.i"]))
+        self.assertEqual(sorted(snapshot["a"].keys()), ["b", "c", "d"])
+        self.assertEqual(len(snapshot["a"]), 3)
+
+    it "can make a dictionary":
+        snapshot = Snapshot(memoryview(dumps(self.options)))
+        self.assertEqual(snapshot.as_dict(), {"a": {"b": 3, "c": [1, 2], "d": {}}, "a-g": 2, "e": "f", "h.i": {"j": None}})
+        self.assertEqual(snapshot["a"].as_dict(), {"b": 3, "c": [1, 2], "d": {}})
+
+    it "keeps keys with dots in them":
+        options = MergedOptions.using({"a.b": 1, "a": {"c": 2}, "d": {"e.f": {"g": 3}}})
+        snapshot = Snapshot(dumps(options))
+        self.assertEqual(snapshot.as_dict(), options.as_dict())
+        self.assertEqual(snapshot.as_dict(), {"a.b": 1, "a": {"c": 2}, "d": {"e.f": {"g": 3}}})
+
+        self.assertEqual(sorted(snapshot.keys()), ["a", "a.b", "d"])
+        self.assertEqual(snapshot["a"].keys(), ["c"])
+        self.assertEqual(snapshot["d"].keys(), ["e.f"])
+        self.assertEqual(snapshot["a.b"], 1)
+        self.assertEqual(snapshot["d.e.f.g"], 3)
+        assert "d.e" not in snapshot
+
+    it "gives out copies of dictionaries and lists":
+        snapshot = Snapshot(dumps(self.options))
+        snapshot["a.c"].append(3)
+        snapshot["a.d"]["z"] = 1
+        self.assertEqual(snapshot["a.c"], [1, 2])
+        self.assertEqual(snapshot["a.d"], {})
+
+    it "remembers sources":
+        snapshot = Snapshot(dumps(self.options))
+        self.assertEqual(snapshot.source_for("a.b"), ["two", "one"])
+        self.assertEqual(snapshot.source_for("a.c"), ["one"])
+        self.assertEqual(snapshot["a"].source_for("c"), ["one"])
+        self.assertEqual(sorted(snapshot.source_for("a")), ["one", "two"])
+
+    it "can ignore keys":
+        snapshot = Snapshot(dumps(self.options, ignore=["a"]))
+        self.assertEqual(sorted(snapshot.keys()), ["a-g", "e", "h.i"])
+
+    it "complains about values it can't serialize":
+        with self.fuzzyAssertRaisesError(BadSnapshot, "Couldn't serialize a"):
+            dumps(MergedOptions.using({"a": object()}))
+
+        snapshot = Snapshot(dumps(MergedOptions.using({"a": object()}), default=lambda v: "obj"))
+        self.assertEqual(snapshot["a"], "obj")
+
+    it "complains about things that aren't snapshots":
+        with self.fuzzyAssertRaisesError(BadSnapshot, "Not a snapshot"):
+            Snapshot(b"\0" * 100)
+
+    describe "load":
+        before_each:
+            self.root = tempfile.mkdtemp()
+
+        after_each:
+            shutil.rmtree(self.root)
+
+        it "loads from a file until the files it was made from change":
+            config = os.path.join(self.root, "config.yml")
+            with open(config, "w") as fle:
+                fle.write("a: 1")
+
+            location = os.path.join(self.root, "snapshot")
+            self.assertIs(Snapshot.load(location), None)
+
+            dump(self.options, location, files=[config])
+            snapshot = Snapshot.load(location)
+            self.assertEqual(snapshot["a.b"], 3)
+            self.assertEqual(snapshot.files(), [os.path.abspath(config)])
+            self.assertEqual(snapshot.fingerprint, fingerprint([config]))
+
+            time.sleep(0.01)
+            with open(config, "w") as fle:
+                fle.write("a: 20")
+            self.assertIs(Snapshot.load(location), None)
+
+        it "doesn't load empty or truncated files":
+            location = os.path.join(self.root, "snapshot")
+            with open(location, "wb") as fle:
+                pass
+            self.assertIs(Snapshot.load(location), None)
+
+            data = dumps(self.options)
+            for size in (10, len(data) // 2, len(data) - 1):
+                with open(location, "wb") as fle:
+                    fle.write(data[:size])
+                self.assertIs(Snapshot.load(location), None)
+
+            with open(location, "wb") as fle:
+                fle.write(data)
+            self.assertEqual(Snapshot.load(location)["a.b"], 3)
+
+    describe "SharedSnapshot":
+        @unittest.skipIf(shared_memory is None, "Needs multiprocessing.shared_memory")
+        it "pickles as the name of the shared memory":
+            shared = SharedSnapshot.create(self.options)
+            try:
+                self.assertEqual(shared["a.b"], 3)
+                self.assertLess(len(pickle.dumps(shared)), 200)
+
+                other = pickle.loads(pickle.dumps(shared))
+                try:
+                    self.assertEqual(other.memory.name, shared.memory.name)
+                    self.assertEqual(other["a"].as_dict(), {"b": 3, "c": [1, 2], "d": {}})
+                    self.assertEqual(other.source_for("e"), ["one"])
+                finally:
+                    other.close()
+            finally:
+                shared.close()
+                shared.unlink()
@@ -1,14 +1,16 @@
 # coding: spec
 
 from option_merge.converter import Converter, Converters
-from option_merge.storage import Storage, DataPath
+from option_merge.storage import Storage, DataPath, Layer, LazyData
 from option_merge.merge import MergedOptions
 from option_merge.not_found import NotFound
 from option_merge.path import Path
+from option_merge import helper as hp
 
 from noseOfYeti.tokeniser.support import noy_sup_setUp
 from delfick_error import DelfickErrorTestMixin
 import unittest
+import pickle
 import mock
 
 class TestCase(unittest.TestCase, DelfickErrorTestMixin): pass
@@ -75,6 +77,244 @@ describe TestCase, "Storage":
         self.assertEqual(self.storage.deleted, [])
         self.assertEqual(self.storage.data, [(path2, data2, source2), (path1, data1, source1)])
 
+    describe "layers":
+        it "remembers if a layer is frozen":
+            self.storage.add(Path([]), d1)
+            self.storage.add(Path(["a"]), d2, source=s1, frozen=True)
+            self.assertEqual(self.storage.data, [(["a"], d2, s1), ([], d1, None)])
+            self.assertEqual([layer.frozen for layer in self.storage.data], [True, False])
+
+            restored = pickle.loads(pickle.dumps(Layer(Path("a"), 1, "s1", frozen=True)))
+            self.assertEqual(restored, (Path("a"), 1, "s1"))
+            self.assertIs(restored.frozen, True)
+
+        it "knows if a layer only has simple keys":
+            self.storage.add(Path([]), {"a": {"b": 1}})
+            self.storage.add(Path([]), {"a": {"b.c": 2}})
+            self.storage.add(Path(["d"]), MergedOptions.using({"e": 3}))
+            self.assertEqual([layer.simple for layer in self.storage.data], [False, False, True])
+
+            self.storage.delete("a.b")
+            self.assertEqual([layer.simple for layer in self.storage.layers()], [False, False, True])
+            self.assertEqual(self.storage.get("a.b.c"), 2)
+
+        it "remembers the order of keys in frozen dictionaries":
+            data = {"a": {"b.c": 1, "b": {"c": 2, "d": 3}}}
+            self.storage.add(Path([]), data, frozen=True)
+            self.storage.add(Path([]), {"e": 4})
+
+            self.assertEqual(self.storage.get("a.b.c"), 1)
+            self.assertEqual(self.storage.get("a.b.d"), 3)
+            self.assertEqual(self.storage.get("e"), 4)
+
+            self.assertEqual(self.storage.frozen_keys(data), ["a"])
+            self.assertEqual(self.storage.frozen_keys(data["a"]), ["b.c", "b"])
+            self.assertEqual(sorted(self.storage._frozen_keys), sorted([id(data), id(data["a"]), id(data["a"]["b"])]))
+
+        it "forgets remembered keys when the layers change":
+            data = {"a": {"b.c": 1}}
+            self.storage.add(Path([]), data, frozen=True)
+            self.assertEqual(self.storage.get("a.b.c"), 1)
+            self.assertEqual(sorted(self.storage._frozen_keys), sorted([id(data), id(data["a"])]))
+
+            self.storage.delete("a")
+            self.storage.compact()
+            other = {"c.d": 2}
+            self.storage.add(Path([]), other, frozen=True)
+            self.assertEqual(self.storage.get("c.d"), 2)
+            self.assertEqual(sorted(self.storage._frozen_keys), [id(other)])
+
+        it "doesn't use remembered keys once deleted from":
+            data = {"a": {"b": 1, "c": 2}}
+            self.storage.add(Path([]), data, frozen=True)
+            self.storage.add(Path([]), {"d": 3})
+            self.assertEqual(self.storage.get("a.b"), 1)
+
+            self.storage.delete("a.b")
+            self.assertEqual(sorted(self.storage.keys_after("a")), ["c"])
+            self.assertEqual(self.storage.as_dict(Path([])), {"a": {"c": 2}, "d": 3})
+            self.assertEqual(data, {"a": {"b": 1, "c": 2}})
+            with self.fuzzyAssertRaisesError(KeyError):
+                self.storage.get("a.b")
+
+        it "only loads lazy data when we look inside it":
+            called = []
+            def loader():
+                called.append(True)
+                return {"c": {"d": 1}, "e": 2}
+            self.storage.add(Path([]), {"a": {"x": 1}})
+            self.storage.add(Path(["a", "b"]), LazyData(loader), source=s1)
+
+            self.assertEqual(sorted(self.storage.keys_after("")), ["a"])
+            self.assertEqual(sorted(self.storage.keys_after("a")), ["b", "x"])
+            self.assertEqual(called, [])
+
+            self.assertEqual(self.storage.get("a.b.c.d"), 1)
+            self.assertEqual(sorted(self.storage.keys_after("a.b")), ["c", "e"])
+            self.assertEqual(self.storage.source_for(Path("a.b.e")), [s1])
+            self.assertEqual(called, [True])
+
+        it "gives loaded values when getting a prefix of a lazy layer":
+            self.storage.add(Path(["a", "b"]), LazyData(lambda: {"c": 1}), source=s1)
+            self.assertEqual(self.storage.get("a"), {"b": {"c": 1}})
+            self.assertEqual(list(self.storage.get_info("a"))[0].data, {"b": {"c": 1}})
+
+        it "pickles lazy data as its data once it is loaded":
+            lazy = LazyData(lambda: {"a": 1})
+            with self.fuzzyAssertRaisesError(Exception):
+                pickle.dumps(lazy)
+
+            self.assertEqual(lazy.load(), {"a": 1})
+            restored = pickle.loads(pickle.dumps(lazy))
+            self.assertIs(restored.is_loaded, True)
+            self.assertEqual(restored.load(), {"a": 1})
+
+            unloaded = pickle.loads(pickle.dumps(LazyData(dict)))
+            self.assertIs(unloaded.is_loaded, False)
+            self.assertEqual(unloaded.load(), {})
+
+        it "can delete from and get the dictionary of lazy data":
+            data = {"c": 1, "e": 2}
+            self.storage.add(Path(["a"]), LazyData(lambda: data))
+            self.assertEqual(self.storage.as_dict(Path([])), {"a": {"c": 1, "e": 2}})
+
+            self.storage.delete("a.e")
+            self.assertEqual(self.storage.as_dict(Path([])), {"a": {"c": 1}})
+            self.assertEqual(data, {"c": 1, "e": 2})
+
+        it "merges identical layers once":
+            shared = {"b": {"c": 1}}
+            self.storage.add(Path(["a"]), {"b": {"d": 2}})
+            self.storage.add(Path(["a"]), shared)
+            self.storage.add(Path(["a"]), shared)
+
+            with mock.patch("option_merge.helper.merge_into_dict", mock.Mock(name="merge_into_dict", wraps=hp.merge_into_dict)) as merge_into_dict:
+                self.assertEqual(self.storage.as_dict(Path(["a"])), {"b": {"c": 1, "d": 2}})
+            self.assertEqual(len(merge_into_dict.mock_calls), 2)
+
+    describe "overlay":
+        it "finds nothing in an overlay of an empty overlay":
+            overlay = self.storage.overlay().overlay()
+            self.assertEqual(list(overlay.keys_after("")), [])
+            self.assertEqual(list(overlay.get_info("")), [])
+
+        it "looks at its own data before the data of the parent":
+            self.storage.add(Path([]), {"a": 1, "b": {"c": 2}}, source=s1)
+            self.storage.add(Path(["b"]), {"d": 3}, source=s2)
+
+            overlay = self.storage.overlay()
+            self.assertIs(overlay.parent, self.storage)
+            self.assertEqual(overlay.data, [])
+
+            overlay.add(Path(["b"]), {"c": 4}, source=s3)
+            self.assertEqual(overlay.data, [(["b"], {"c": 4}, s3)])
+            self.assertEqual(list(overlay.layers()), overlay.data + self.storage.data)
+
+            self.assertEqual(overlay.get(Path("b.c")), 4)
+            self.assertEqual(self.storage.get(Path("b.c")), 2)
+            self.assertEqual(overlay.source_for(Path("b.c")), [s3, s1])
+            self.assertEqual(overlay.as_dict(Path([])), {"a": 1, "b": {"c": 4, "d": 3}})
+
+        it "includes the version of the parent":
+            self.storage.add(Path([]), {"a": 1})
+            self.storage.add(Path([]), {"a": 2})
+            overlay = self.storage.overlay()
+
+            version = overlay.version
+            self.storage.add(Path([]), {"a": 3})
+            self.assertNotEqual(overlay.version, version)
+
+        it "passes on deletes it can't do itself":
+            self.storage.add(Path(["a"]), d1)
+            overlay = self.storage.overlay()
+            overlay.add(Path(["b"]), d2)
+
+            overlay.delete("a")
+            self.assertEqual(self.storage.data, [])
+            self.assertEqual(overlay.data, [(["b"], d2, None)])
+
+            with self.fuzzyAssertRaisesError(KeyError, "a"):
+                overlay.delete("a")
+
+    describe "compact":
+        it "inlines MergedOptions layers":
+            options = MergedOptions.using({"a": {"b": 1}}, source=s1)
+            options.update({"a": {"c": 2}}, source=s2)
+            self.storage.add(Path([]), options, source=s3)
+            self.storage.add(Path(["d"]), {"e": 3}, source=s4)
+            self.storage.add(Path(["f"]), options["a"], source=s5)
+
+            before = (self.storage.as_dict(Path([])), self.storage.source_for(Path("a.b")), self.storage.source_for(Path("f.c")))
+            self.storage.compact()
+            self.assertEqual(self.storage.data
+                , [ (["f"], {"c": 2}, s2)
+                  , (["f"], {"b": 1}, s1)
+                  , (["d"], {"e": 3}, s4)
+                  , ([], {"a": {"c": 2}}, s2)
+                  , ([], {"a": {"b": 1}}, s1)
+                  ]
+                )
+            self.assertEqual((self.storage.as_dict(Path([])), self.storage.source_for(Path("a.b")), self.storage.source_for(Path("f.c"))), before)
+
+        it "merges adjacent dictionaries with the same prefix and source":
+            self.storage.add(Path(["a"]), {"b": {"c": 1}}, source=s1)
+            self.storage.add(Path(["a"]), {"b": {"d": 2}, "e": 3}, source=s1)
+            self.storage.add(Path(["a"]), {"e": 4}, source=s1)
+            self.storage.add(Path(["a"]), {"f": 5}, source=s2)
+
+            self.storage.compact()
+            self.assertEqual(self.storage.data
+                , [ (["a"], {"f": 5}, s2)
+                  , (["a"], {"e": 4}, s1)
+                  , (["a"], {"b": {"c": 1, "d": 2}, "e": 3}, s1)
+                  ]
+                )
+            self.assertEqual(self.storage.get(Path("a.e")), 4)
+
+        it "leaves MergedOptions with converters or without sources alone":
+            with_converters = MergedOptions.using({"a": 1})
+            with_converters.add_converter(Converter(convert=lambda p, v: v, convert_path=["a"]))
+            without_source = MergedOptions.using({"b": 2})
+
+            self.storage.add(Path([]), with_converters)
+            self.storage.add(Path([]), without_source, source=s1)
+            data = list(self.storage.data)
+
+            self.storage.compact()
+            self.assertEqual(self.storage.data, data)
+
+        it "doesn't merge dictionaries with dots in their keys":
+            self.storage.add(Path([]), {"a": {"b": 1}})
+            self.storage.add(Path([]), {"a.b": 2})
+
+            self.storage.compact()
+            self.assertEqual(self.storage.data, [([], {"a.b": 2}, None), ([], {"a": {"b": 1}}, None)])
+
+        it "keeps whether layers are frozen":
+            self.storage.add(Path(["a"]), {"b": 1}, source=s1, frozen=True)
+            self.storage.add(Path(["a"]), {"c": 2}, source=s1, frozen=True)
+            self.storage.add(Path(["d"]), {"e": 3}, source=s2, frozen=True)
+            self.storage.add(Path(["d"]), {"f": 4}, source=s2)
+            self.storage.add(Path(["g"]), {"h": 5}, source=s3, frozen=True)
+
+            self.storage.compact()
+            self.assertEqual([layer.frozen for layer in self.storage.data], [True, False, True])
+            self.assertEqual(self.storage.data[2], (["a"], {"b": 1, "c": 2}, s1))
+
+        it "doesn't change the version if there is nothing to compact":
+            self.storage.add(Path(["a"]), {"b": 1}, source=s1, frozen=True)
+            self.storage.add(Path(["a"]), {"c": 2}, source=s1)
+            self.storage.add(Path(["d"]), {"e": 3}, source=s2)
+
+            self.storage.compact()
+            version = self.storage.version
+            data = list(self.storage.data)
+
+            self.storage.compact()
+            self.assertEqual(self.storage.version, version)
+            self.assertEqual(self.storage.data, data)
+            self.assertIs(self.storage.data[-1], data[-1])
+
     describe "Deleting":
         it "removes first thing with the same path":
             self.storage.add(Path(["a", "b"]), d1)
@@ -101,7 +341,7 @@ describe TestCase, "Storage":
             self.storage.add(Path(["b", "c"]), d2)
             self.storage.add(Path(["a", "b"]), d3)
             self.storage.add(Path(["a", "bd"]), d4)
-            def delete_from_data_func(d, p):
+            def delete_from_data_func(d, p, layer):
                 if d is d1:
                     return True
                 elif d is d3:
@@ -114,7 +354,11 @@ describe TestCase, "Storage":
             with mock.patch.object(self.storage, "delete_from_data", delete_from_data):
                 self.storage.delete("a.b.c.d")
 
-            self.assertEqual(delete_from_data.mock_calls, [mock.call(d3, "c.d"), mock.call(d1, "d")])
+            self.assertEqual(delete_from_data.mock_calls
+                , [ mock.call(d3, "c.d", layer=self.storage.data[1])
+                  , mock.call(d1, "d", layer=self.storage.data[3])
+                  ]
+                )
 
         it "raises an Index error if it can't find the key":
             self.storage.add(Path(["a", "b", "c"]), d1)
@@ -133,13 +377,72 @@ describe TestCase, "Storage":
             self.assertEqual(self.storage.data, [([], {"a": {"d": "e"}}, None), ([], {"c": "d"}, None), ([], {"a": "b"}, None)])
 
             self.storage.delete("a.d")
-            self.assertEqual(self.storage.data, [([], {"a": {}}, None), ([], {"c": "d"}, None), ([], {"a": "b"}, None)])
+            self.assertEqual(list(self.storage.layers()), [([], {"a": {}}, None), ([], {"c": "d"}, None), ([], {"a": "b"}, None)])
 
             self.storage.delete("a")
-            self.assertEqual(self.storage.data, [([], {}, None), ([], {"c": "d"}, None), ([], {"a": "b"}, None)])
+            self.assertEqual(list(self.storage.layers()), [([], {}, None), ([], {"c": "d"}, None), ([], {"a": "b"}, None)])
 
             self.storage.delete("a")
-            self.assertEqual(self.storage.data, [([], {}, None), ([], {"c": "d"}, None), ([], {}, None)])
+            self.assertEqual(list(self.storage.layers()), [([], {}, None), ([], {"c": "d"}, None), ([], {}, None)])
+
+        it "doesn't change the data it was given":
+            first = {"a": {"b": 1, "c": {"d": 2}}, "e": 3}
+            second = {"a": {"b": 4}}
+            self.storage.add(Path([]), first)
+            self.storage.add(Path([]), second)
+
+            self.storage.delete("a.b")
+            self.storage.delete("a.b")
+            self.storage.delete("a.c.d")
+            self.storage.delete("e")
+
+            self.assertEqual(first, {"a": {"b": 1, "c": {"d": 2}}, "e": 3})
+            self.assertEqual(second, {"a": {"b": 4}})
+            self.assertEqual(self.storage.data, [([], second, None), ([], first, None)])
+            self.assertEqual(self.storage.deleted
+                , [ (self.storage.data[0], ("a", "b"))
+                  , (self.storage.data[1], ("a", "b"))
+                  , (self.storage.data[1], ("a", "c", "d"))
+                  , (self.storage.data[1], ("e", ))
+                  ]
+                )
+
+            self.assertEqual(list(self.storage.layers()), [([], {"a": {}}, None), ([], {"a": {"c": {}}}, None)])
+            self.assertEqual(self.storage.as_dict(Path([])), {"a": {"c": {}}})
+            self.assertEqual(sorted(self.storage.keys_after("a")), ["c"])
+            self.assertEqual(list(self.storage.get_info("a.c"))[0].data, {})
+            self.assertIs(list(self.storage.layers())[1][1]["a"]["c"], list(self.storage.layers())[1][1]["a"]["c"])
+
+        it "removes tombstones along with their layer":
+            self.storage.add(Path(["a"]), {"b": 1, "c": 2})
+            self.storage.delete("a.b")
+            self.assertEqual(len(self.storage.deleted), 1)
+
+            self.storage.delete("a")
+            self.assertEqual(self.storage.data, [])
+            self.assertEqual(self.storage.deleted, [])
+
+        it "deletes many paths in turn":
+            self.storage.add(Path(["a", "b"]), d1)
+            self.storage.add(Path([]), {"a": {"c": 1}, "b": 2})
+            self.storage.add(Path(["b", "c"]), d2)
+            self.storage.add(Path(["a", "b"]), d3)
+
+            self.storage.delete_many(["a.b", "a.c", "b", "a.b", "b"])
+            self.assertEqual(list(self.storage.layers()), [([], {"a": {}}, None)])
+
+        it "deletes what it can't find from the parent":
+            self.storage.add(Path(["a"]), d1)
+            self.storage.add(Path(["b"]), d2)
+            overlay = self.storage.overlay()
+            overlay.add(Path(["a"]), d3)
+
+            overlay.delete_many(["a", "b", "a"])
+            self.assertEqual(overlay.data, [])
+            self.assertEqual(self.storage.data, [])
+
+            with self.fuzzyAssertRaisesError(KeyError, "c"):
+                overlay.delete_many(["c"])
 
     describe "Delete from data":
         it "returns False if the data is not a dictionary":
@@ -172,6 +475,16 @@ describe TestCase, "Storage":
             self.assertEqual(data, {"one": 1, "two": 2, "three": {"four": 5}})
             assert res is True
 
+        it "deletes from the longest key that is a prefix first":
+            data = {"one": {"two.three": 1}, "one.two": {"three": 2}}
+            res = self.storage.delete_from_data(data, "one.two.three")
+            self.assertEqual(data, {"one": {"two.three": 1}, "one.two": {}})
+            assert res is True
+
+            res = self.storage.delete_from_data(data, "one.two.three")
+            self.assertEqual(data, {"one": {}, "one.two": {}})
+            assert res is True
+
         it "deletes into dictionaries":
             data = {"one": {"two": {"three.four": {"five": 6}, "seven": 7}}}
             res = self.storage.delete_from_data(data, "one.two.three.four.five")
@@ -312,6 +625,32 @@ describe TestCase, "Storage":
             with self.fuzzyAssertRaisesError(KeyError, "e.g"):
                 list(self.storage.get_info("e.g"))
 
+    describe "view":
+        it "remembers views whilst they are used":
+            made = []
+            class View(object): pass
+            def make():
+                made.append(View())
+                return made[-1]
+
+            view = self.storage.view(("a", ), make)
+            self.assertIs(self.storage.view(("a", ), make), view)
+            self.assertIsNot(self.storage.view(("b", ), make), view)
+            self.assertEqual(len(made), 2)
+
+            del made[:]
+            del view
+            self.assertEqual(len(self.storage._views), 0)
+
+    describe "first_values":
+        it "returns the first value for each path it finds":
+            self.storage.add(Path([]), {"a": {"b": d1, "c": d2}, "d": d3})
+            self.storage.add(Path(["a"]), {"b": d4})
+            self.storage.add(Path(["e", "f"]), d5)
+
+            found = self.storage.first_values([Path("a.b"), Path("a.c"), Path("d"), Path("e.f"), Path("e"), Path("g")])
+            self.assertEqual(found, {"a.b": d4, "a.c": d2, "d": d3, "e.f": d5, "e": {"f": d5}})
+
     describe "get":
         it "returns data from the first info":
             data = mock.Mock(name="data")
@@ -367,6 +706,154 @@ describe TestCase, "Storage":
             self.assertEqual(self.storage.source_for(Path("a.bd")), [s1, s2])
             self.assertEqual(self.storage.source_for(Path("a.bd.1")), [s2])
 
+        it "remembers sources until the version changes":
+            self.storage.add(Path([]), {"a": {"b": 1}}, source=s1)
+            self.storage.add(Path(["a"]), {"b": 2}, source=s2)
+            self.assertEqual(self.storage.source_for(Path("a.b")), [s2, s1])
+
+            get_info = mock.Mock(name="get_info", side_effect=Exception("Shouldn't be called"))
+            with mock.patch.object(self.storage, "get_info", get_info):
+                self.assertEqual(self.storage.source_for(Path("a.b")), [s2, s1])
+
+            self.storage.add(Path(["a", "b"]), 3, source=s3)
+            self.assertEqual(self.storage.source_for(Path("a.b")), [s3, s2, s1])
+
+        it "forgets sources when a nested storage changes":
+            inner = MergedOptions.using({"a": 1}, source=s1)
+            outer = MergedOptions.using({"b": 1}, source=s2)
+            outer.update(inner)
+            self.assertEqual(outer.source_for("a"), [s1])
+
+            inner.update({"a": 2}, source=s3)
+            self.assertEqual(outer.source_for("a"), [s3, s1])
+
+        it "follows nested storages":
+            options = MergedOptions.using({"b": {"c": 1}}, source=s1)
+            options.update({"b": {"c": 2}}, source=s2)
+            self.storage.add(Path([]), {"a": 1}, source=s3)
+            self.storage.add(Path(["a"]), options, source=s4)
+            self.assertEqual(self.storage.source_for(Path("a.b.c")), [s2, s1])
+            self.assertEqual(self.storage.source_for(Path("a")), [s4, s3])
+
+    describe "source_map":
+        it "returns the same sources as source_for for every path":
+            options = MergedOptions.using({"b": {"c": 1}}, source=s1)
+            options.update({"b": {"c": 2, "d": 3}}, source=s2)
+            options.update({"b": {"d": 4}})
+
+            self.storage.add(Path(["a", "b", "c"]), d1, source=s1)
+            self.storage.add(Path(["a", "bd"]), {"1": d4}, source=s2)
+            self.storage.add(Path([]), {"a": {"bd": d4}, "e.f": {"g": 1}}, source=s3)
+            self.storage.add(Path(["a", "b", "c"]), {"d": {"e": d6}}, source=s6)
+            self.storage.add(Path(["h"]), options, source=s4)
+            self.storage.add(Path(["i"]), {"j": options}, source=s5)
+
+            self.assertEqual(self.storage.source_map()
+                , { "a": [s6, s3, s2, s1], "a.b": [s6, s1], "a.b.c": [s6, s1], "a.b.c.d": [s6], "a.b.c.d.e": [s6]
+                  , "a.bd": [s3, s2], "a.bd.1": [s2]
+                  , "e.f": [s3], "e.f.g": [s3]
+                  , "h": [s4], "h.b": [s2, s1], "h.b.c": [s2, s1], "h.b.d": [s2]
+                  , "i": [s5], "i.j": [s5], "i.j.b": [s5], "i.j.b.c": [s5], "i.j.b.d": [s5]
+                  }
+                )
+
+            for path, sources in self.storage.source_map().items():
+                self.assertEqual(self.storage.source_for(Path(path)), sources)
+
+        it "only includes paths under the prefix":
+            self.storage.add(Path([]), {"a": {"b": {"c": 1}}, "ab": 2}, source=s1)
+            self.storage.add(Path(["a", "b", "d"]), 3, source=s2)
+            self.assertEqual(self.storage.source_map("a.b"), {"a.b": [s2, s1], "a.b.c": [s1], "a.b.d": [s2]})
+
+        it "stops at storages that contain themselves":
+            options = MergedOptions(storage=self.storage)
+            self.storage.add(Path([]), {"a": 1}, source=s1)
+            self.storage.add(Path(["b"]), options, source=s2)
+            self.assertEqual(self.storage.source_map(), {"a": [s1], "b": [s2]})
+
+    describe "might_have":
+        it "knows which paths are definitely missing":
+            self.storage.add(Path([]), {"a": {"b": 1, "c.d": {"e": 2}}, 3: 4}, frozen=True)
+            self.storage.add(Path(["f", "g"]), {"h": 5}, frozen=True)
+
+            for path in ("", "a", "a.b", "a.c", "a.c.d", "a.c.d.e", "3", "f", "f.g", "f.g.h", ["a", "c.d"]):
+                self.assertIs(self.storage.might_have(Path.convert(path)), True, path)
+
+            for path in ("b", "a.e", "a.b.c", "f.h", "f.g.i", "a.c.e"):
+                self.assertIs(self.storage.might_have(Path.convert(path)), False, path)
+
+            with mock.patch.object(self.storage, "determine_path_and_val") as determine_path_and_val:
+                with self.fuzzyAssertRaisesError(KeyError):
+                    self.storage.get("a.e")
+            self.assertEqual(len(determine_path_and_val.mock_calls), 0)
+
+        it "keeps up with new layers and parents":
+            self.storage.add(Path([]), {"a": 1}, frozen=True)
+            self.storage.add(Path([]), {"b": 2}, frozen=True)
+            self.assertIs(self.storage.might_have(Path("c")), False)
+
+            self.storage.add(Path(["c"]), 3, frozen=True)
+            self.assertIs(self.storage.might_have(Path("c")), True)
+            self.assertEqual(self.storage.get("c"), 3)
+
+            overlay = self.storage.overlay()
+            overlay.add(Path([]), {"d": 4}, frozen=True)
+            overlay.add(Path([]), {"e": 5}, frozen=True)
+            self.assertEqual(overlay.get("a"), 1)
+            self.assertIs(overlay.might_have(Path("f")), False)
+
+            self.storage.add(Path([]), {"f": 6}, frozen=True)
+            self.assertEqual(overlay.get("f"), 6)
+
+            self.storage.delete("a")
+            self.storage.compact()
+            self.assertIs(self.storage.might_have(Path("a")), False)
+            self.assertEqual(overlay.get("f"), 6)
+
+        it "doesn't know about values that look after their own keys":
+            self.storage.add(Path([]), {"a": 1}, frozen=True)
+            self.storage.add(Path(["b"]), MergedOptions.using({"c": 2}), frozen=True)
+            self.storage.add(Path(["d"]), LazyData(lambda: {"e": 3}), frozen=True)
+            self.storage.add(Path([]), {"f": MergedOptions.using({"g": 4})}, frozen=True)
+
+            self.assertEqual(self.storage.get("b.c"), 2)
+            self.assertEqual(self.storage.get("d.e"), 3)
+            self.assertEqual(self.storage.get("f.g"), 4)
+            self.assertIs(self.storage.might_have(Path("b.z")), True)
+            self.assertIs(self.storage.might_have(Path("z")), False)
+
+        it "finds keys added to dictionaries that aren't frozen":
+            data = {"a": 1}
+            self.storage.add(Path(["b"]), data)
+            self.storage.add(Path([]), {"c": 2}, frozen=True)
+            self.assertIs(self.storage.might_have(Path("d")), False)
+            self.assertIs(self.storage.might_have(Path("b.e")), True)
+
+            data["e"] = 3
+            self.assertEqual(self.storage.get("b.e"), 3)
+
+    describe "stats":
+        it "describes the layers, duplicates and caches":
+            self.storage.add(Path([]), {"a": {"b": 1, "c": 2}, "d": 3}, source=s1)
+            self.storage.add(Path(["a"]), {"b": 4}, source=s2, frozen=True)
+            self.storage.add(Path(["e"]), MergedOptions.using({"f": 5, "g": {"h": 6}}))
+            self.storage.add(Path(["i"]), LazyData(lambda: {"j": 7}), source=s3)
+            self.assertEqual(self.storage.get("a.c"), 2)
+            self.storage.delete("d")
+
+            stats = self.storage.stats()
+            self.assertEqual(stats["layers"]
+                , [ {"prefix": "i", "source": s3, "keys": None, "frozen": False, "lazy": True}
+                  , {"prefix": "e", "source": None, "keys": 2, "frozen": False, "lazy": False}
+                  , {"prefix": "a", "source": s2, "keys": 1, "frozen": True, "lazy": False}
+                  , {"prefix": "", "source": s1, "keys": 2, "frozen": False, "lazy": False}
+                  ]
+                )
+            self.assertEqual(stats["duplicates"], {"a.b": 2})
+            self.assertEqual(stats["tombstones"], 1)
+            self.assertEqual(stats["views"], 0)
+            self.assertEqual(stats["caches"]["_get_info_cached"], 1)
+
     describe "keys_after":
         it "yields combined keys from datas":
             self.storage.add(Path([]), {"a": 1, "b": 2})
@@ -438,6 +925,61 @@ describe TestCase, "Storage":
             options[["blah", "stuff"]] = 1
             self.assertEqual(options.as_dict(), {"blah": {"stuff": 1}})
 
+        it "finds paths inside, at and past the prefix of the data":
+            self.storage.add(Path(["a", "b", "c"]), {"d": 1})
+            self.storage.add(Path(["a", "bc"]), {"e": 2})
+            self.assertEqual(self.storage.as_dict(Path([])), {"a": {"b": {"c": {"d": 1}}, "bc": {"e": 2}}})
+            self.assertEqual(self.storage.as_dict(Path("a")), {"b": {"c": {"d": 1}}, "bc": {"e": 2}})
+            self.assertEqual(self.storage.as_dict(Path(["a", "b"])), {"c": {"d": 1}})
+            self.assertEqual(self.storage.as_dict(Path("a.b.c")), {"d": 1})
+            self.assertEqual(self.storage.as_dict(Path(["a", "b", "c", "d"])), 1)
+
+        it "treats prefixes with dots in their parts as keys with dots":
+            self.storage.add(Path(["a.b"]), {"c": 1})
+            self.storage.add(Path([]), {"a": {"d": 2}})
+            self.assertEqual(self.storage.as_dict(Path([])), {"a.b": {"c": 1}, "a": {"d": 2}})
+            self.assertEqual(self.storage.as_dict(Path("a.b")), {"c": 1})
+            self.assertEqual(self.storage.as_dict(Path(["a"])), {"d": 2})
+
+        describe "caching":
+            before_each:
+                self.storage.add(Path([]), {"a": {"b": 1}, "c": 2})
+                self.storage.add(Path(["a"]), {"d": {"e": 3}})
+
+            it "remembers the result until the version changes":
+                self.assertEqual(self.storage.as_dict(Path([])), {"a": {"b": 1, "d": {"e": 3}}, "c": 2})
+
+                merged_dict = mock.Mock(name="merged_dict", side_effect=Exception("Shouldn't be called"))
+                with mock.patch.object(self.storage, "merged_dict", merged_dict):
+                    self.assertEqual(self.storage.as_dict(Path([])), {"a": {"b": 1, "d": {"e": 3}}, "c": 2})
+
+                self.storage.add(Path(["a", "d"]), 4)
+                self.assertEqual(self.storage.as_dict(Path([])), {"a": {"b": 1, "d": 4}, "c": 2})
+
+            it "gives each caller their own dictionaries":
+                first = self.storage.as_dict(Path(["a"]))
+                first["d"]["e"] = 5
+                first["f"] = 6
+                self.assertEqual(self.storage.as_dict(Path(["a"])), {"b": 1, "d": {"e": 3}})
+
+            it "notices changes to MergedOptions in the layers":
+                options = MergedOptions.using({"g": 1})
+                self.storage.add(Path(["f"]), options)
+                self.assertEqual(self.storage.as_dict(Path(["f"])), {"g": 1})
+
+                options.update({"g": 2})
+                self.assertEqual(self.storage.as_dict(Path(["f"])), {"g": 2})
+
+            it "notices changes to MergedOptions inside dictionaries":
+                inner = MergedOptions.using({"x": 1})
+                outer = MergedOptions.using({"b": 1})
+                outer.update({"a": inner})
+                self.assertEqual(outer.as_dict(), {"a": {"x": 1}, "b": 1})
+
+                inner.update({"x": 2})
+                self.assertEqual(outer.as_dict(), {"a": {"x": 2}, "b": 1})
+                self.assertEqual(outer["a"].as_dict(), {"x": 2})
+
 describe TestCase, "DataPath":
     it "takes in path, data and source":
         p1 = mock.Mock(name="p1")
@@ -65,3 +65,27 @@ describe TestCase, "value_at":
         b = blah({"a":1})
         data = MergedOptions.using({"one": b})
         self.assertEqual(value_at(data, Path(["one", "a"])), (Path(["one", "a"]), 1))
+
+    describe "with simple keys":
+        it "looks up each part of the path":
+            value = mock.Mock(name="value")
+            data = {"blah": {"meh": {"stuff": value}}, "other": 1}
+            self.assertEqual(value_at(data, Path("blah.meh.stuff"), simple=True), (["blah", "meh", "stuff"], value))
+            self.assertEqual(value_at(data, Path(["blah", "meh", "stuff"]), simple=True), (["blah", "meh", "stuff"], value))
+            self.assertEqual(value_at(data, Path("other"), simple=True), (Path("other"), 1))
+
+        it "finds the same things as without simple keys":
+            data = {"blah": {"meh": {"stuff": 1}, "other": {"thing": 2}}}
+            for path in ("blah", "blah.meh", "blah.meh.stuff", ["blah", "meh.stuff"], "blah.other.thing", ["blah", "other"], "nope", "blah.nope", "blah.meh.stuff.more"):
+                try:
+                    expected = value_at(data, Path.convert(path))
+                except NotFound:
+                    with self.fuzzyAssertRaisesError(NotFound):
+                        value_at(data, Path.convert(path), simple=True)
+                else:
+                    self.assertEqual(value_at(data, Path.convert(path), simple=True), expected)
+
+        it "doesn't assume MergedOptions have simple keys":
+            options = MergedOptions.using({"a": {"b.c": 1}}, dont_prefix=[dict])
+            data = {"one": options}
+            self.assertEqual(value_at(data, Path("one.a.b.c"), simple=True), (["one", "a", "b.c"], 1))